@@ -0,0 +1,6 @@
+"""
+Benchmarks for the timetable optimizer.
+
+    python3 benchmarks/optimizer_suite.py            # replay captured payloads and a synthetic grid
+    python3 benchmarks/worker_pool_latency.py        # spawn-per-request vs the worker pool
+"""
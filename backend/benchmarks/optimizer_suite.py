@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Reproducible optimizer benchmark.
+
+Replays the captured backend/temp payloads and a grid of synthetic
+workloads through TimetableOptimizer.optimize, each on a fresh optimizer so
+no result or preparation cache carries over between runs, and writes one
+JSON report with per-phase timings, model size, search effort and
+objective quality for every run.
+
+    python3 benchmarks/optimizer_suite.py -o bench.json
+    python3 benchmarks/optimizer_suite.py --no-replay --modules 4,8 --pools 10,30 --densities 0.2,0.5
+    python3 benchmarks/optimizer_suite.py --formulations cliques,intervals
+    python3 benchmarks/optimizer_suite.py --objective-modes weighted,lexicographic
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from typing import Dict, List, Any
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'scripts'))
+
+from ortools import __version__ as ortools_version  # noqa: E402
+
+from benchmarks.workloads import VENUES_PATH, captured_workloads, synthetic_workloads  # noqa: E402
+from optimized_timetable_optimizer import MODEL_VERSION, TimetableOptimizer  # noqa: E402
+from result_cache import ResultCache  # noqa: E402
+
+
+def parse_list(value: str, cast) -> List[Any]:
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+
+def run_workload(workload: Dict[str, Any], solver_options: Dict[str, Any],
+                 objective_mode: str = "weighted") -> Dict[str, Any]:
+    """Solve one workload cold and describe the run"""
+    payload = workload["payload"]
+    optimizer = TimetableOptimizer(VENUES_PATH, ResultCache())
+    constraints = {**payload.get("constraints", {}), "objectiveMode": objective_mode}
+
+    started = time.perf_counter()
+    result = optimizer.optimize(payload.get("modules", {}), constraints, solver_options)
+    wall_seconds = time.perf_counter() - started
+
+    stats = result.get("stats", {})
+    solver_stats = stats.get("solver", {})
+    return {
+        "name": workload["name"],
+        "source": workload["source"],
+        "params": workload["params"],
+        "formulation": solver_options.get("formulation", "cliques"),
+        "objectiveMode": objective_mode,
+        "status": result["status"],
+        "objective": result["objective"],
+        "bestBound": result["bestBound"],
+        "gap": result["gap"],
+        "heuristic": result.get("heuristic"),
+        "stages": result.get("stages"),
+        **stats.get("model", {}),
+        "branches": solver_stats.get("branches"),
+        "conflicts": solver_stats.get("conflicts"),
+        "phases": stats.get("phases", {}),
+        "wallSeconds": round(wall_seconds, 4),
+    }
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    statuses: Dict[str, int] = {}
+    phases: Dict[str, Dict[str, float]] = {}
+    for run in runs:
+        statuses[run["status"]] = statuses.get(run["status"], 0) + 1
+        for name, timing in run["phases"].items():
+            total = phases.setdefault(name, {"wallSeconds": 0.0, "cpuSeconds": 0.0})
+            for key, value in timing.items():
+                total[key] = round(total[key] + value, 4)
+    return {
+        "runs": len(runs),
+        "statuses": statuses,
+        "phases": phases,
+        "wallSeconds": round(sum(run["wallSeconds"] for run in runs), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the timetable optimizer on captured and synthetic workloads')
+    parser.add_argument('-o', '--output', help='Report file (default: stdout)')
+    parser.add_argument('--no-replay', action='store_true', help='Skip the captured backend/temp payloads')
+    parser.add_argument('--no-synthetic', action='store_true', help='Skip the synthetic workloads')
+    parser.add_argument('--modules', default='4,6,8', help='Comma-separated module counts')
+    parser.add_argument('--pools', default='10,30', help='Comma-separated tutorial pool sizes')
+    parser.add_argument('--sessions', default='2', help='Comma-separated sessions per lecture class')
+    parser.add_argument('--densities', default='0.3', help='Comma-separated fractions of hours marked unavailable')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the synthetic workloads')
+    parser.add_argument('--time-limit', type=float, default=30.0, help='Solver time limit per run in seconds')
+    parser.add_argument('--workers', type=int, default=4, help='CP-SAT search workers per run')
+    parser.add_argument('--formulations', default='cliques',
+                        help='Comma-separated clash formulations to run every workload with')
+    parser.add_argument('--objective-modes', default='weighted',
+                        help='Comma-separated objective modes to run every workload with')
+
+    args = parser.parse_args()
+
+    workloads = []
+    if not args.no_replay:
+        workloads += captured_workloads()
+    if not args.no_synthetic:
+        workloads += synthetic_workloads(parse_list(args.modules, int), parse_list(args.pools, int),
+                                         parse_list(args.sessions, int), parse_list(args.densities, float),
+                                         args.seed)
+    if not workloads:
+        print("Error: No workloads selected", file=sys.stderr)
+        sys.exit(1)
+
+    solver_options = {"timeLimitSeconds": args.time_limit, "numSearchWorkers": args.workers}
+    formulations = parse_list(args.formulations, str.strip)
+    objective_modes = parse_list(args.objective_modes, str.strip)
+    runs = []
+    for workload in workloads:
+        for formulation in formulations:
+            for objective_mode in objective_modes:
+                print(f"Running {workload['name']} ({formulation}, {objective_mode})", file=sys.stderr)
+                runs.append(run_workload(workload, {**solver_options, "formulation": formulation}, objective_mode))
+
+    report = {
+        "createdAt": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        "python": platform.python_version(),
+        "ortools": ortools_version,
+        "modelVersion": MODEL_VERSION,
+        "cpuCount": os.cpu_count(),
+        "settings": {**solver_options, "formulations": formulations, "objectiveModes": objective_modes,
+                     "seed": args.seed},
+        "runs": runs,
+        "summary": summarize(runs),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
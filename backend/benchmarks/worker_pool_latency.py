@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Compare request latency of the spawn-per-request path against the
+long-lived worker pool.
+
+The spawn path mirrors what routes/optimize.js does when the pool is disabled:
+run optimize_cli.py --framed with the request framed on stdin. The pool path
+keeps optimizer_worker.py processes alive and sends requests over
+stdin/stdout. Both speak the length-prefixed framing in scripts/framing.py.
+
+    python3 benchmarks/worker_pool_latency.py --requests 40 --concurrency 2
+"""
+
+import argparse
+import glob
+import json
+import os
+import queue
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS_DIR = os.path.join(BACKEND_DIR, 'scripts')
+VENUES_PATH = os.path.join(SCRIPTS_DIR, 'venues.json')
+sys.path.insert(0, SCRIPTS_DIR)
+
+from framing import HEADER, decode, encode, read_frame, write_frame  # noqa: E402
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize(samples: List[float], wall_seconds: float) -> Dict[str, Any]:
+    return {
+        "requests": len(samples),
+        "p50Ms": round(percentile(samples, 50), 1),
+        "p99Ms": round(percentile(samples, 99), 1),
+        "meanMs": round(statistics.mean(samples), 1),
+        "maxMs": round(max(samples), 1),
+        "throughputPerSec": round(len(samples) / wall_seconds, 2),
+    }
+
+
+def run_spawned(payload: Dict[str, Any]) -> float:
+    started = time.perf_counter()
+    request = encode(payload)
+    subprocess.run(
+        [sys.executable, 'optimize_cli.py', '--framed', '--locations', VENUES_PATH],
+        cwd=SCRIPTS_DIR, input=HEADER.pack(len(request)) + request,
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+    return (time.perf_counter() - started) * 1000
+
+
+class WorkerHandle:
+    def __init__(self):
+        self.proc = subprocess.Popen(
+            [sys.executable, 'optimizer_worker.py', '--locations', VENUES_PATH],
+            cwd=SCRIPTS_DIR, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL)
+        self.next_id = 0
+        ready = decode(read_frame(self.proc.stdout))
+        if ready.get("type") != "ready":
+            raise RuntimeError(f"Unexpected worker greeting: {ready}")
+
+    def request(self, payload: Dict[str, Any]) -> float:
+        self.next_id += 1
+        started = time.perf_counter()
+        write_frame(self.proc.stdin, {"id": self.next_id, **payload})
+        response = decode(read_frame(self.proc.stdout))
+        while response.get("type") == "incumbent":
+            response = decode(read_frame(self.proc.stdout))
+        if not response.get("ok"):
+            raise RuntimeError(response.get("error"))
+        return (time.perf_counter() - started) * 1000
+
+    def close(self):
+        self.proc.stdin.close()
+        self.proc.wait()
+
+
+def bench_spawn(payloads: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(run_spawned, payloads))
+    return summarize(samples, time.perf_counter() - started)
+
+
+def bench_pool(payloads: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    warm_started = time.perf_counter()
+    idle: "queue.Queue[WorkerHandle]" = queue.Queue()
+    workers = [WorkerHandle() for _ in range(concurrency)]
+    for worker in workers:
+        idle.put(worker)
+    warmup_ms = (time.perf_counter() - warm_started) * 1000
+
+    def run(payload: Dict[str, Any]) -> float:
+        # Latency includes waiting for a free worker, as a queued HTTP request would
+        queued_at = time.perf_counter()
+        worker = idle.get()
+        try:
+            worker.request(payload)
+        finally:
+            idle.put(worker)
+        return (time.perf_counter() - queued_at) * 1000
+
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            samples = list(executor.map(run, payloads))
+    finally:
+        for worker in workers:
+            worker.close()
+
+    summary = summarize(samples, time.perf_counter() - started)
+    summary["poolWarmupMs"] = round(warmup_ms, 1)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark spawn-per-request vs the optimizer worker pool')
+    parser.add_argument('inputs', nargs='*', help='Request payload files (default: backend/temp/optimization_input_*.json)')
+    parser.add_argument('-n', '--requests', type=int, default=20, help='Requests per mode')
+    parser.add_argument('-c', '--concurrency', type=int, default=2, help='Concurrent requests / pool size')
+
+    args = parser.parse_args()
+
+    input_files = args.inputs or sorted(glob.glob(os.path.join(BACKEND_DIR, 'temp', 'optimization_input_*.json')))
+    if not input_files:
+        print("Error: No request payloads found", file=sys.stderr)
+        sys.exit(1)
+
+    samples = []
+    for path in input_files:
+        with open(path, 'r') as f:
+            samples.append(json.load(f))
+    payloads = [samples[i % len(samples)] for i in range(args.requests)]
+
+    print(f"Running {args.requests} requests per mode at concurrency {args.concurrency}", file=sys.stderr)
+    report = {
+        "inputs": [os.path.basename(path) for path in input_files],
+        "concurrency": args.concurrency,
+        "spawn": bench_spawn(payloads, args.concurrency),
+        "pool": bench_pool(payloads, args.concurrency),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
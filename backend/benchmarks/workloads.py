@@ -0,0 +1,121 @@
+"""
+Benchmark workloads: captured request payloads and seeded synthetic ones.
+
+Synthetic workloads are shaped like NUSMods data. Each module has a few
+lecture classes, a pool of tutorials and half as many labs. Classes run on the hour, on
+weekdays, in rooms near the module's home building, and some labs run only
+on odd or even weeks. The same parameters and seed always produce the same
+payload.
+"""
+
+import glob
+import json
+import os
+import random
+from typing import Dict, List, Any
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS_DIR = os.path.join(BACKEND_DIR, 'scripts')
+VENUES_PATH = os.path.join(SCRIPTS_DIR, 'venues.json')
+CAPTURED_PATTERN = os.path.join(BACKEND_DIR, 'temp', 'optimization_input_*.json')
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+TEACHING_WEEKS = list(range(1, 14))
+FIRST_SLOT_HOUR = 8
+LAST_SLOT_HOUR = 20  # Last hour a class may end at
+
+# (lessonType, classes, hours per session, repeats each week) relative to the tutorial pool size
+LESSON_SHAPES = [
+    ("Lecture", lambda pool: max(2, pool // 5), 2, True),
+    ("Tutorial", lambda pool: pool, 1, False),
+    ("Laboratory", lambda pool: max(1, pool // 2), 2, False),
+]
+
+
+def captured_workloads(pattern: str = CAPTURED_PATTERN) -> List[Dict[str, Any]]:
+    """Payloads captured from real requests, as {"name", "source", "params", "payload"}"""
+    workloads = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, 'r') as f:
+            payload = json.load(f)
+        workloads.append({
+            "name": os.path.splitext(os.path.basename(path))[0],
+            "source": "captured",
+            "params": {"modules": len(payload.get("modules", {}))},
+            "payload": payload,
+        })
+    return workloads
+
+
+def load_venue_buildings(venues_path: str = VENUES_PATH) -> Dict[str, List[str]]:
+    """Venue codes grouped by building prefix (the part before the first '-')"""
+    with open(venues_path, 'r') as f:
+        venues = json.load(f)
+    buildings: Dict[str, List[str]] = {}
+    for code in sorted(venues):
+        buildings.setdefault(code.split('-')[0], []).append(code)
+    return buildings
+
+
+def synthetic_payload(modules: int, pool: int, sessions: int, density: float, seed: int,
+                      buildings: Dict[str, List[str]]) -> Dict[str, Any]:
+    """
+    A request for `modules` modules with `pool` tutorial classes each, `sessions`
+    sessions a week per lecture class, and `density` of weekday hours
+    marked unavailable in preferredTimeSlots.
+    """
+    rng = random.Random(seed)
+    building_names = sorted(buildings)
+
+    payload_modules = {}
+    for m in range(modules):
+        module_code = f"SYN{1000 + m}"
+        home = rng.choice(building_names)
+        nearby = buildings[home] + buildings[rng.choice(building_names)]
+
+        timetable = []
+        for lesson_type, classes, hours, repeats in LESSON_SHAPES:
+            for c in range(classes(pool)):
+                lesson_sessions = sessions if repeats else 1
+                weeks = TEACHING_WEEKS
+                if lesson_type == "Laboratory" and rng.random() < 0.3:
+                    weeks = TEACHING_WEEKS[rng.randrange(2)::2]  # Odd or even weeks only
+                for day in rng.sample(WEEKDAYS, lesson_sessions):
+                    start = rng.randint(FIRST_SLOT_HOUR, LAST_SLOT_HOUR - hours)
+                    timetable.append({
+                        "lessonType": lesson_type,
+                        "classNo": f"{lesson_type[0]}{c + 1:02d}",
+                        "day": day,
+                        "startTime": f"{start:02d}00",
+                        "endTime": f"{start + hours:02d}00",
+                        "venue": rng.choice(nearby),
+                        "weeks": list(weeks),
+                    })
+        payload_modules[module_code] = {"moduleCode": module_code, "timetable": timetable}
+
+    preferred_time_slots = {
+        day: {f"{hour:02d}00": rng.random() >= density for hour in range(FIRST_SLOT_HOUR, LAST_SLOT_HOUR)}
+        for day in WEEKDAYS
+    }
+    return {"modules": payload_modules, "constraints": {"preferredTimeSlots": preferred_time_slots}}
+
+
+def synthetic_workloads(module_counts: List[int], pools: List[int], sessions: List[int],
+                        densities: List[float], seed: int = 1,
+                        venues_path: str = VENUES_PATH) -> List[Dict[str, Any]]:
+    """One workload per combination of the given parameters"""
+    buildings = load_venue_buildings(venues_path)
+    workloads = []
+    for modules in module_counts:
+        for pool in pools:
+            for session_count in sessions:
+                for density in densities:
+                    params = {"modules": modules, "pool": pool, "sessions": session_count,
+                              "density": density, "seed": seed}
+                    workloads.append({
+                        "name": f"synthetic_m{modules}_p{pool}_s{session_count}_d{density:g}",
+                        "source": "synthetic",
+                        "params": params,
+                        "payload": synthetic_payload(modules, pool, session_count, density, seed, buildings),
+                    })
+    return workloads
@@ -2,98 +2,114 @@ const express = require('express');
 const { spawn } = require('child_process');
 const path = require('path');
 const fs = require('fs').promises;
+const { getOptimizerPool, OptimizerPoolError, optimizerEnv } = require('../services/optimizerPool');
+const { resultFromIncumbent } = require('../services/optimizerResults');
+const { encodeFrame, FrameDecoder } = require('../services/framing');
+const { getOptimizerScheduler, SchedulerRejection } = require('../services/optimizerScheduler');
 const router = express.Router();
 
-const tempDir = path.join(__dirname, '../temp');
-fs.mkdir(tempDir, { recursive: true }).catch(() => {});
+const OPTIMIZATION_TIMEOUT_MS = 90000;
+// The solver is told to stop a little before the hard timeout so it can
+// hand back its best solution instead of being killed mid-search.
+const SOLVER_BUDGET_MS = 85000;
+// Heuristic-only requests finish in well under a second, so their deadline is
+// short and the scheduler starts them ahead of full solves
+const HEURISTIC_BUDGET_MS = 10000;
+const MAX_TIMETABLES = 10;
 
-router.post('/optimize-timetable', async (req, res) => {
-  console.log('Received optimization request');
-  
-  try {
-    const { modules, constraints } = req.body;
-
-    if (!modules || typeof modules !== 'object' || Object.keys(modules).length === 0) {
-      return res.status(400).json({ 
-        error: 'Invalid or empty modules data',
-        received: typeof modules
-      });
-    }
-
-    if (!constraints || typeof constraints !== 'object') {
-      return res.status(400).json({ 
-        error: 'Invalid constraints data',
-        received: typeof constraints
-      });
-    }
+class OptimizationError extends Error {
+  constructor(status, body) {
+    super(body.error);
+    this.status = status;
+    this.body = body;
+  }
+}
 
-    const { preferredTimeSlots } = constraints;
-    
-    if (!preferredTimeSlots || typeof preferredTimeSlots !== 'object') {
-      return res.status(400).json({ 
-        error: 'Invalid preferred time slots. Must be an object with day-time mappings.' 
-      });
-    }
+function describeOptimizerError(errorData) {
+  if (errorData.includes('location')) {
+    return 'Venue location data issue. Check venues.json file format.';
+  } else if (errorData.includes('ortools')) {
+    return 'OR-Tools library issue. Make sure ortools is installed: pip install ortools';
+  } else if (errorData.includes('ModuleNotFoundError')) {
+    return 'Missing Python dependencies. Run: pip install ortools';
+  } else if (errorData.includes('KeyError')) {
+    return 'Data format error in input modules or constraints';
+  }
+  return 'Unknown optimization error';
+}
 
-    const hasSelectedSlots = Object.values(preferredTimeSlots).some(daySlots =>
-      Object.values(daySlots).some(isSelected => isSelected === true)
-    );
+async function runPooledOptimizer(pool, payload, timeoutMs) {
+  try {
+    return await pool.run(payload, { timeoutMs });
+  } catch (error) {
+    if (!(error instanceof OptimizerPoolError)) throw error;
 
-    if (!hasSelectedSlots) {
-      return res.status(400).json({ 
-        error: 'No time slots selected. Please select at least some preferred times.' 
-      });
-    }
+    console.error(`Pooled optimization failed: ${error.message}`);
+    const details = error.details || '';
+    throw new OptimizationError(500, {
+      error: error.message,
+      details: describeOptimizerError(details),
+      fullError: details.split('\n').slice(-10).join('\n')
+    });
+  }
+}
 
-    console.log(`Processing ${Object.keys(modules).length} modules with constraints`);
+async function runSpawnedOptimizer(payload, timeoutMs) {
+  const pythonScriptPath = path.join(__dirname, '../scripts/optimize_cli.py');
+  const venuesPath = path.join(__dirname, '../scripts/venues.json');
 
-    const timestamp = Date.now();
-    const tempInputFile = path.join(tempDir, `optimization_input_${timestamp}.json`);
-    const inputData = { modules, constraints };
-    
-    await fs.writeFile(tempInputFile, JSON.stringify(inputData, null, 2));
-    console.log(`Created temp file: ${tempInputFile}`);
-
-    const pythonScriptPath = path.join(__dirname, '../scripts/optimize_cli.py');
-    const venuesPath = path.join(__dirname, '../scripts/venues.json');
-    
-    try {
-      await fs.access(pythonScriptPath);
-      await fs.access(venuesPath);
-      console.log('Python script and venues file found');
-    } catch (error) {
-      console.error(`Required files not found:`);
-      console.error(`Python script: ${pythonScriptPath}`);
-      console.error(`Venues file: ${venuesPath}`);
-      await fs.unlink(tempInputFile).catch(() => {});
-      return res.status(500).json({ 
-        error: 'Optimization files not found',
-        missing: error.path,
-        suggestion: 'Make sure optimize_cli.py and venues.json exist in the scripts directory'
-      });
-    }
+  try {
+    await fs.access(pythonScriptPath);
+    await fs.access(venuesPath);
+    console.log('Python script and venues file found');
+  } catch (error) {
+    console.error(`Required files not found:`);
+    console.error(`Python script: ${pythonScriptPath}`);
+    console.error(`Venues file: ${venuesPath}`);
+    throw new OptimizationError(500, {
+      error: 'Optimization files not found',
+      missing: error.path,
+      suggestion: 'Make sure optimize_cli.py and venues.json exist in the scripts directory'
+    });
+  }
 
-    console.log('Starting Python optimization process...');
+  console.log('Starting Python optimization process...');
+  return new Promise((resolve, reject) => {
     const pythonProcess = spawn('python3', [
-      pythonScriptPath, 
-      tempInputFile, 
+      pythonScriptPath,
       '--locations', venuesPath,
+      '--framed',
       '-v'
     ], {
       stdio: ['pipe', 'pipe', 'pipe'],
       cwd: path.dirname(pythonScriptPath),
-      env: { ...process.env, PYTHONUNBUFFERED: '1' }
+      env: optimizerEnv()
     });
 
-    let outputData = '';
     let errorData = '';
+    let bestIncumbent = null;
+    let finalResult = null;
+    let parseError = null;
+    let timedOut = false;
 
-    pythonProcess.stdout.on('data', (data) => {
-      const output = data.toString();
-      outputData += output;
-      console.log('Python stdout:', output.trim());
+    // --framed writes one frame per message: improving incumbents, then the result
+    const decoder = new FrameDecoder((message) => {
+      if (message.type === 'incumbent') {
+        bestIncumbent = message;
+      } else if (message.type === 'result') {
+        const { type, ...result } = message;
+        finalResult = result;
+      }
+    }, (error, payload) => {
+      parseError = error;
+      console.error('Failed to parse Python output frame:', payload ? payload.toString('utf8', 0, 1000) : error.message);
     });
 
+    pythonProcess.stdout.on('data', chunk => decoder.push(chunk));
+    // The request goes over stdin, so nothing is written to disk
+    pythonProcess.stdin.on('error', () => {});
+    pythonProcess.stdin.end(encodeFrame(payload));
+
     pythonProcess.stderr.on('data', (data) => {
       const errorMsg = data.toString();
       errorData += errorMsg;
@@ -102,114 +118,216 @@ router.post('/optimize-timetable', async (req, res) => {
 
     const timeout = setTimeout(() => {
       console.log('Optimization timeout, killing process');
+      timedOut = true;
       pythonProcess.kill('SIGTERM');
-    }, 90000);
+    }, timeoutMs);
 
-    pythonProcess.on('close', async (code) => {
+    pythonProcess.on('close', (code) => {
       clearTimeout(timeout);
-      
-      try {
-        await fs.unlink(tempInputFile).catch(() => {});
-
-        if (code !== 0) {
-          console.error(`Python process failed with code: ${code}`);
-          console.error('Error details:', errorData);
-          
-          let errorMessage = 'Unknown optimization error';
-          if (errorData.includes('location')) {
-            errorMessage = 'Venue location data issue. Check venues.json file format.';
-          } else if (errorData.includes('ortools')) {
-            errorMessage = 'OR-Tools library issue. Make sure ortools is installed: pip install ortools';
-          } else if (errorData.includes('ModuleNotFoundError')) {
-            errorMessage = 'Missing Python dependencies. Run: pip install ortools';
-          } else if (errorData.includes('KeyError')) {
-            errorMessage = 'Data format error in input modules or constraints';
-          }
-          
-          return res.status(500).json({ 
-            error: 'Optimization process failed',
-            code: code,
-            details: errorMessage,
-            fullError: errorData.split('\n').slice(-10).join('\n')
-          });
-        }
-
-        if (!outputData.trim()) {
-          console.error('No output from Python process');
-          return res.status(500).json({ 
-            error: 'No optimization result received',
-            suggestion: 'Python script may have crashed silently'
-          });
-        }
-
-        try {
-          const lines = outputData.split('\n');
-          let jsonLine = '';
-          
-          for (const line of lines) {
-            const trimmed = line.trim();
-            if (trimmed.startsWith('{') && trimmed.endsWith('}')) {
-              jsonLine = trimmed;
-              break;
-            }
-          }
-          
-          if (!jsonLine) {
-            jsonLine = outputData.trim();
-          }
-          
-          const result = JSON.parse(jsonLine);
-          console.log('Optimization completed successfully');
-          
-          const resultModules = Object.keys(result);
-          console.log(`Optimized ${resultModules.length} modules`);
-          
-          res.json(result);
-
-        } catch (parseError) {
-          console.error('Failed to parse Python output:', parseError.message);
-          console.error('Raw output (first 1000 chars):', outputData.substring(0, 1000));
-          
-          res.status(500).json({ 
-            error: 'Failed to parse optimization result',
-            details: parseError.message,
-            suggestion: 'Python script output format may be incorrect'
-          });
-        }
-
-      } catch (cleanupError) {
-        console.error('Error during cleanup:', cleanupError);
-        res.status(500).json({ 
-          error: 'Internal server error during cleanup'
-        });
+      if (!finalResult && decoder.pending) {
+        parseError = parseError || new Error(`Output ended inside a frame (${decoder.pending} bytes left over)`);
       }
+
+      if (finalResult) {
+        return resolve(finalResult);
+      }
+
+      if (timedOut && bestIncumbent) {
+        console.log('Returning best incumbent found before the timeout');
+        return resolve(resultFromIncumbent(payload.modules, bestIncumbent));
+      }
+
+      if (code !== 0) {
+        console.error(`Python process failed with code: ${code}`);
+        console.error('Error details:', errorData);
+
+        return reject(new OptimizationError(500, {
+          error: 'Optimization process failed',
+          code: code,
+          details: describeOptimizerError(errorData),
+          fullError: errorData.split('\n').slice(-10).join('\n')
+        }));
+      }
+
+      if (parseError) {
+        return reject(new OptimizationError(500, {
+          error: 'Failed to parse optimization result',
+          details: parseError.message,
+          suggestion: 'Python script output format may be incorrect'
+        }));
+      }
+
+      console.error('No output from Python process');
+      reject(new OptimizationError(500, {
+        error: 'No optimization result received',
+        suggestion: 'Python script may have crashed silently'
+      }));
     });
 
-    pythonProcess.on('error', async (error) => {
+    pythonProcess.on('error', (error) => {
       clearTimeout(timeout);
       console.error('Failed to start Python process:', error);
-      
-      await fs.unlink(tempInputFile).catch(() => {});
-      
+
       let errorMessage = 'Failed to start optimization process';
       if (error.code === 'ENOENT') {
         errorMessage = 'Python3 not found. Make sure Python 3 is installed and accessible.';
       }
-      
-      res.status(500).json({ 
+
+      reject(new OptimizationError(500, {
         error: errorMessage,
         details: error.message,
         suggestion: 'Make sure Python 3 and ortools are installed'
+      }));
+    });
+  });
+}
+
+router.post('/optimize-timetable', async (req, res) => {
+  console.log('Received optimization request');
+  const receivedAt = Date.now();
+
+  try {
+    const { modules, constraints } = req.body;
+
+    if (!modules || typeof modules !== 'object' || Object.keys(modules).length === 0) {
+      return res.status(400).json({
+        error: 'Invalid or empty modules data',
+        received: typeof modules
+      });
+    }
+
+    if (!constraints || typeof constraints !== 'object') {
+      return res.status(400).json({
+        error: 'Invalid constraints data',
+        received: typeof constraints
+      });
+    }
+
+    const { preferredTimeSlots } = constraints;
+
+    if (!preferredTimeSlots || typeof preferredTimeSlots !== 'object') {
+      return res.status(400).json({
+        error: 'Invalid preferred time slots. Must be an object with day-time mappings.'
+      });
+    }
+
+    const hasSelectedSlots = Object.values(preferredTimeSlots).some(daySlots =>
+      Object.values(daySlots).some(isSelected => isSelected === true)
+    );
+
+    if (!hasSelectedSlots) {
+      return res.status(400).json({
+        error: 'No time slots selected. Please select at least some preferred times.'
       });
+    }
+
+    console.log(`Processing ${Object.keys(modules).length} modules with constraints`);
+
+    // Callers may ask for a tighter time limit; the solver deadline also
+    // orders queued jobs, so tighter limits start sooner
+    let solverBudgetMs = req.body.heuristicOnly === true ? HEURISTIC_BUDGET_MS : SOLVER_BUDGET_MS;
+    if (Number.isInteger(req.body.timeLimitMs) && req.body.timeLimitMs > 0) {
+      solverBudgetMs = Math.min(req.body.timeLimitMs, SOLVER_BUDGET_MS);
+    }
+    const timeoutAt = receivedAt + solverBudgetMs + (OPTIMIZATION_TIMEOUT_MS - SOLVER_BUDGET_MS);
+
+    const payload = {
+      modules,
+      constraints,
+      solver: { deadlineMs: receivedAt + solverBudgetMs }
+    };
+
+    // Re-optimizing after a small edit: warm-start from the previous answer
+    // ({ selection, constraints }) and optionally keep unaffected classes.
+    // Classes are only kept when the caller sends its own previous answer.
+    const { previous } = req.body;
+    if (previous && typeof previous === 'object') {
+      const isObject = value => value && typeof value === 'object' && !Array.isArray(value);
+      if (previous.constraints !== undefined && !isObject(previous.constraints)) {
+        return res.status(400).json({
+          error: 'Invalid previous constraints. Must be the constraints object of the previous request.'
+        });
+      }
+      payload.solver.previous = previous;
+      if (req.body.fixUnchanged === true) {
+        payload.solver.fixUnchanged = true;
+      }
+    }
+    // Latency-sensitive callers can take the local search timetable, which
+    // is clash-free but not proven optimal, without waiting for CP-SAT
+    if (req.body.heuristicOnly === true) {
+      payload.solver.heuristic = 'only';
+    }
+    // Further distinct timetables ("another option") from the same solve,
+    // returned best first under timetables in the envelope
+    if (Number.isInteger(req.body.topK) && req.body.topK > 1) {
+      payload.solver.topK = Math.min(req.body.topK, MAX_TIMETABLES);
+      if (Number.isInteger(req.body.minDistance) && req.body.minDistance > 0) {
+        payload.solver.minDistance = req.body.minDistance;
+      }
+    }
+
+    // The scheduler decides when the job starts and how many search workers
+    // it gets; time spent queued comes out of the job's timeout
+    const pool = getOptimizerPool();
+    const result = await getOptimizerScheduler().schedule(payload.solver.deadlineMs, (searchWorkers) => {
+      payload.solver.numSearchWorkers = searchWorkers;
+      const timeoutMs = Math.max(timeoutAt - Date.now(), 1);
+      return pool
+        ? runPooledOptimizer(pool, payload, timeoutMs)
+        : runSpawnedOptimizer(payload, timeoutMs);
     });
 
+    console.log(`Optimization finished with status ${result.status} (objective ${result.objective}, gap ${result.gap})`);
+    console.log(`Optimized ${Object.keys(result.modules).length} modules`);
+
+    res.set('X-Optimizer-Status', String(result.status));
+    res.set('X-Optimizer-Cache', result.cached ? 'hit' : 'miss');
+    if (result.objective !== null && result.objective !== undefined) {
+      res.set('X-Optimizer-Objective', String(result.objective));
+    }
+    if (result.gap !== null && result.gap !== undefined) {
+      res.set('X-Optimizer-Gap', String(result.gap));
+    }
+    if (result.stats && result.stats.phases) {
+      const phases = Object.entries(result.stats.phases);
+      console.log('Optimizer phases:', phases
+        .map(([name, timing]) => `${name}=${Math.round(timing.wallSeconds * 1000)}ms`).join(' '));
+      res.set('Server-Timing', phases
+        .map(([name, timing]) => `${name};dur=${(timing.wallSeconds * 1000).toFixed(1)}`).join(', '));
+    }
+
+    // The frontend merges the body straight into its module map, so the
+    // full envelope is only sent when explicitly asked for.
+    res.json(req.body.responseFormat === 'envelope' ? result : result.modules);
+
   } catch (error) {
+    if (error instanceof OptimizationError) {
+      return res.status(error.status).json(error.body);
+    }
+    if (error instanceof SchedulerRejection) {
+      console.log(`Optimization request rejected: ${error.message}`);
+      if (error.retryAfterSeconds) res.set('Retry-After', String(error.retryAfterSeconds));
+      return res.status(error.status).json({
+        error: error.message,
+        retryAfterSeconds: error.retryAfterSeconds
+      });
+    }
+
     console.error('Optimization endpoint error:', error);
-    res.status(500).json({ 
+    res.status(500).json({
       error: 'Internal server error',
       details: error.message
     });
   }
 });
 
+router.get('/optimizer-status', (req, res) => {
+  const pool = getOptimizerPool();
+  res.json({
+    ...(pool ? { mode: 'pool', ...pool.status() } : { mode: 'spawn' }),
+    scheduler: getOptimizerScheduler().status()
+  });
+});
+
 module.exports = router;
@@ -0,0 +1,73 @@
+"""
+Length-prefixed message framing between the Node backend and optimizer processes.
+
+Every message is one frame: a 4-byte big-endian payload length followed by
+that many bytes of compact UTF-8 JSON. The reader always knows where a message
+ends, so payloads may be any size and contain anything, and nothing has to be
+scanned for line breaks. services/framing.js implements the same format.
+
+orjson is used for encoding and decoding when it is installed; the bytes on
+the wire are plain JSON either way.
+"""
+
+import json
+import struct
+from typing import Any, BinaryIO, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+HEADER = struct.Struct('>I')
+MAX_FRAME_BYTES = 256 * 1024 * 1024  # Anything larger is a corrupt length, not a real request
+
+
+class FramingError(Exception):
+    """The stream ended inside a frame or announced an impossible length"""
+
+
+def encode(message: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(message, separators=(',', ':')).encode('utf-8')
+
+
+def decode(payload: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+def write_frame(out: BinaryIO, message: Any):
+    """Write one message as a frame and flush it"""
+    payload = encode(message)
+    out.write(HEADER.pack(len(payload)) + payload)
+    out.flush()
+
+
+def _read_exactly(instream: BinaryIO, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        chunk = instream.read(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def read_frame(instream: BinaryIO) -> Optional[bytes]:
+    """Payload of the next frame, or None at a clean end of stream"""
+    header = _read_exactly(instream, HEADER.size)
+    if not header:
+        return None
+    if len(header) < HEADER.size:
+        raise FramingError("Stream ended inside a frame header")
+
+    (size,) = HEADER.unpack(header)
+    if size > MAX_FRAME_BYTES:
+        raise FramingError(f"Frame of {size} bytes exceeds the {MAX_FRAME_BYTES} byte limit")
+    payload = _read_exactly(instream, size)
+    if len(payload) < size:
+        raise FramingError(f"Stream ended after {len(payload)} of {size} frame bytes")
+    return payload
@@ -0,0 +1,223 @@
+import random
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+DEFAULT_TIME_BUDGET_SECONDS = 0.05
+MAX_STALLED_RESTARTS = 50  # Restarts in a row without a better timetable before the search gives up early
+
+
+class LocalSearch:
+    """
+    Greedy construction and local search over class choices, scoring timetables
+    with the same objective as the CP-SAT model so both results are comparable.
+
+    Each (module, lessonType) group gets one of its candidate classes. Clashes
+    are hard in the model; here they cost more than any objective term could
+    gain, so the search repairs them before it improves anything else and a
+    result with clashes only comes back when none could be removed. Single-group
+    moves are backed by ejection chains and, when those still leave clashes,
+    a backtracking search for any clash-free choice.
+    """
+
+    def __init__(self, groups: List[List[int]], class_scores: List[int], pair_scores: List[Dict[int, int]],
+                 clashes: List[Set[int]], seed: int = 0):
+        self.groups = groups
+        self.class_scores = class_scores
+        self.pair_scores = pair_scores
+        self.clashes = clashes
+        self.random = random.Random(seed)
+
+        bound = sum(max(abs(class_scores[b]) for b in members) for members in self.groups)
+        bound += sum(abs(score) for members in self.groups for b in members for score in pair_scores[b].values())
+        self.clash_cost = bound + 1
+
+        self.group_of = {b: g for g, members in enumerate(self.groups) for b in members}
+
+        self.chosen: List[int] = []
+        self.selected: Set[int] = set()
+
+    def gain(self, g: int, candidate: int) -> int:
+        """Change in score from switching group g to candidate"""
+        current = self.chosen[g]
+        if candidate == current:
+            return 0
+        delta = self.class_scores[candidate] - self.class_scores[current]
+        for other, score in self.pair_scores[candidate].items():
+            if other in self.selected and other != current:
+                delta += score
+        for other, score in self.pair_scores[current].items():
+            if other in self.selected:
+                delta -= score
+        clashes = len(self.clashes[candidate] & self.selected) - len(self.clashes[current] & self.selected)
+        return delta - clashes * self.clash_cost
+
+    def move(self, g: int, candidate: int):
+        self.selected.discard(self.chosen[g])
+        self.chosen[g] = candidate
+        self.selected.add(candidate)
+
+    def construct(self, hints: Dict[int, int]):
+        """Hinted classes first, then the most constrained groups pick their best fitting class"""
+        self.chosen = [-1] * len(self.groups)
+        self.selected = set()
+        for g, members in enumerate(self.groups):
+            if hints.get(g) in members:
+                self.chosen[g] = hints[g]
+                self.selected.add(hints[g])
+
+        for g in sorted(range(len(self.groups)), key=lambda g: len(self.groups[g])):
+            if self.chosen[g] >= 0:
+                continue
+
+            def fit(b):
+                pairs = sum(score for other, score in self.pair_scores[b].items() if other in self.selected)
+                return self.class_scores[b] + pairs - len(self.clashes[b] & self.selected) * self.clash_cost
+
+            self.chosen[g] = max(self.groups[g], key=fit)
+            self.selected.add(self.chosen[g])
+
+    def neighbours(self, b: int) -> Set[int]:
+        """Groups with a candidate whose gain depends on whether class b is selected"""
+        related = self.clashes[b] | self.pair_scores[b].keys()
+        return {self.group_of[other] for other in related if other in self.group_of}
+
+    def eject(self, g: int) -> Optional[Set[int]]:
+        """
+        Ejection chain repair of a clashing group: switch g to another class,
+        then move every group that class clashes with to its best class given
+        the switch. The chain is kept only if it gains overall, so two classes
+        blocking each other's only clash-free slot can trade places where no
+        single move helps. Returns the groups the chain affected, or None.
+        """
+        others = [b for b in self.groups[g] if b != self.chosen[g]]
+        self.random.shuffle(others)
+        for candidate in sorted(others, key=lambda b: len(self.clashes[b] & self.selected)):
+            undo = [(g, self.chosen[g])]
+            total = self.gain(g, candidate)
+            self.move(g, candidate)
+            for h in sorted({self.group_of[b] for b in self.clashes[candidate] & self.selected}):
+                best_gain, best = max((self.gain(h, b), b) for b in self.groups[h])
+                if best_gain > 0:
+                    undo.append((h, self.chosen[h]))
+                    total += best_gain
+                    self.move(h, best)
+            if total > 0:
+                return set().union(*(self.neighbours(b) | self.neighbours(self.chosen[h]) for h, b in undo))
+            for h, previous in reversed(undo):
+                self.move(h, previous)
+        return None
+
+    def improve(self, deadline: float, groups: Optional[Set[int]] = None) -> bool:
+        """
+        Best-improvement moves in one group at a time until none helps, then
+        ejection chains from clashing groups while any of them repairs a clash.
+        Only groups (default: all) and the neighbours of classes that moved are
+        examined. False if the deadline hit first.
+        """
+        pending = set(range(len(self.groups)) if groups is None else groups)
+        while pending:
+            order = list(pending)
+            self.random.shuffle(order)
+            pending = set()
+            for g in order:
+                if time.perf_counter() > deadline:
+                    return False
+                best_gain, best = max((self.gain(g, b), b) for b in self.groups[g])
+                if best_gain > 0:
+                    pending |= self.neighbours(self.chosen[g]) | self.neighbours(best)
+                    self.move(g, best)
+            if pending:
+                continue
+            clashing = [g for g, b in enumerate(self.chosen) if self.clashes[b] & self.selected]
+            for g in clashing:
+                if time.perf_counter() > deadline:
+                    return False
+                if self.clashes[self.chosen[g]] & self.selected:
+                    pending |= self.eject(g) or set()
+        return True
+
+    def backtrack(self, deadline: float) -> bool:
+        """
+        Depth-first search for a clash-free choice, most constrained group first,
+        dropping each chosen class's clashes from the other groups' candidates.
+        Each group tries its current class first, then the best scoring ones.
+        Replaces the current choice and returns True if one is found before the deadline.
+        """
+        domains = [sorted(members, key=lambda b: (b != self.chosen[g], -self.class_scores[b]))
+                   for g, members in enumerate(self.groups)]
+        assignment = [-1] * len(self.groups)
+
+        def search(domains: List[List[int]]) -> bool:
+            if time.perf_counter() > deadline:
+                return False
+            open_groups = [g for g in range(len(self.groups)) if assignment[g] < 0]
+            if not open_groups:
+                return True
+            g = min(open_groups, key=lambda g: len(domains[g]))
+            for b in domains[g]:
+                narrowed = list(domains)
+                for h in self.neighbours(b):
+                    if h != g and assignment[h] < 0:
+                        narrowed[h] = [c for c in domains[h] if c not in self.clashes[b]]
+                        if not narrowed[h]:
+                            break
+                else:
+                    assignment[g] = b
+                    if search(narrowed):
+                        return True
+                    assignment[g] = -1
+            return False
+
+        if not search(domains):
+            return False
+        self.chosen = assignment
+        self.selected = set(assignment)
+        return True
+
+    def score(self) -> Tuple[int, int]:
+        """(objective, clashing pairs) of the current choice"""
+        objective = sum(self.class_scores[b] for b in self.chosen)
+        objective += sum(score for b in self.chosen for other, score in self.pair_scores[b].items()
+                         if other in self.selected and other > b)
+        clashing = sum(len(self.clashes[b] & self.selected) for b in self.chosen) // 2
+        return objective, clashing
+
+    def solve(self, hints: Optional[Dict[int, int]] = None,
+              time_budget: float = DEFAULT_TIME_BUDGET_SECONDS) -> Tuple[Set[int], int, int]:
+        """
+        Construct a timetable and improve it until it is locally optimal, falling
+        back to backtrack() if clashes remain, then perturb it and search again
+        until time_budget seconds pass or restarts stop finding anything better.
+        hints maps group indexes to classes to start from. Returns
+        (selected bundles, objective, clashing pairs) of the best timetable found.
+        """
+        deadline = time.perf_counter() + time_budget
+        self.construct(hints or {})
+        self.improve(deadline)
+        if self.score()[1] and self.backtrack(deadline):
+            self.improve(deadline)
+        best_chosen = list(self.chosen)
+        best = self.score()
+
+        # Restarts from a perturbed best: a few groups take a random class each,
+        # chosen among the clashing groups while there are any
+        stalled = 0
+        while time.perf_counter() < deadline and self.groups and stalled < MAX_STALLED_RESTARTS:
+            stalled += 1
+            self.chosen = list(best_chosen)
+            self.selected = set(self.chosen)
+            clashing_groups = [g for g, b in enumerate(self.chosen) if self.clashes[b] & self.selected]
+            pool = clashing_groups or range(len(self.groups))
+            perturbed = set()
+            for g in self.random.sample(pool, min(3, len(pool))):
+                perturbed |= {g} | self.neighbours(self.chosen[g])
+                self.move(g, self.random.choice(self.groups[g]))
+                perturbed |= self.neighbours(self.chosen[g])
+            if not self.improve(deadline, perturbed):
+                break
+            objective, clashing = self.score()
+            if (clashing, -objective) < (best[1], -best[0]):
+                best_chosen, best = list(self.chosen), (objective, clashing)
+                stalled = 0
+
+        return set(best_chosen), best[0], best[1]
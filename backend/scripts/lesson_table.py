@@ -0,0 +1,330 @@
+import sys
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Any, Optional, Set, Tuple
+
+import numpy as np
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+TEACHING_WEEKS = 14
+ALL_WEEKS = (1 << TEACHING_WEEKS) - 1
+RECESS_AFTER_WEEK = 6  # The calendar week after teaching week 6 is recess week
+
+# Monday of teaching week 1 of each semester, as in the frontend's
+# Dashboard/AcademicCalendar.ts; add each new semester to both
+SEMESTER_STARTS = [date(2024, 8, 12), date(2025, 1, 13), date(2025, 8, 11), date(2026, 1, 12),
+                   date(2026, 8, 10)]
+SEMESTER_CALENDAR_WEEKS = 18  # Teaching, recess, reading and exam weeks
+
+MINUTES_PER_DAY = 24 * 60
+INVALID_LESSON_PENALTY = 1000  # Lessons that end before they start
+
+
+def blocked_minute_prefix(day_preferences: Dict[str, Any]) -> np.ndarray:
+    """
+    Compile one day of preferredTimeSlots into prefix sums of blocked minutes:
+    prefix[m] is the number of blocked minutes before minute m. A slot "HHMM"
+    marked unavailable blocks the hour starting at HHMM; unlisted slots are free.
+    """
+    blocked = np.zeros(MINUTES_PER_DAY, dtype=np.int32)
+    for slot, available in day_preferences.items():
+        if available:
+            continue
+        try:
+            slot_start = int(slot[:2]) * 60 + int(slot[2:4])
+        except (TypeError, ValueError):
+            print(f"Ignoring invalid time slot {slot}", file=sys.stderr)
+            continue
+        blocked[max(slot_start, 0):max(slot_start + 60, 0)] = 1
+    return np.concatenate(([0], np.cumsum(blocked)))
+
+
+def blocked_slots(day_preferences: Any) -> Set[str]:
+    """The "HHMM" slots of one day of preferredTimeSlots that are marked unavailable"""
+    if not isinstance(day_preferences, dict):
+        return set()
+    return {slot for slot, available in day_preferences.items() if not available}
+
+
+def _date_range_weeks(weeks: Dict[str, Any], semester_start: date) -> List[int]:
+    """Teaching week numbers covered by a NUSMods {start, end, weekInterval} date range"""
+    start = date.fromisoformat(weeks["start"])
+    end = date.fromisoformat(weeks["end"])
+    interval = int(weeks.get("weekInterval", 1)) or 1
+
+    teaching_weeks = []
+    calendar_week = (start - semester_start).days // 7
+    last_calendar_week = (end - semester_start).days // 7
+    while calendar_week <= last_calendar_week:
+        if calendar_week < RECESS_AFTER_WEEK:
+            teaching_weeks.append(calendar_week + 1)
+        elif calendar_week > RECESS_AFTER_WEEK:
+            teaching_weeks.append(calendar_week)
+        calendar_week += interval
+    return teaching_weeks
+
+
+def calendar_semester_start(lessons: List[Dict[str, Any]]) -> Optional[date]:
+    """
+    Week 1 Monday of the semester in SEMESTER_STARTS holding the earliest date
+    range among lessons, for requests that give no semesterStart. None when no
+    lesson has a date range or it falls outside every known semester.
+    """
+    first = None
+    for lesson in lessons:
+        weeks = lesson.get("weeks")
+        if not isinstance(weeks, dict) or isinstance(weeks.get("weeks"), list):
+            continue
+        try:
+            start = date.fromisoformat(weeks["start"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        first = start if first is None else min(first, start)
+    if first is None:
+        return None
+
+    for semester_start in reversed(SEMESTER_STARTS):
+        if semester_start - timedelta(weeks=1) <= first < semester_start + timedelta(weeks=SEMESTER_CALENDAR_WEEKS):
+            return semester_start
+    print(f"No known semester holds lessons from {first}; add it to SEMESTER_STARTS", file=sys.stderr)
+    return None
+
+
+def week_mask(weeks: Any, semester_start: Optional[date] = None) -> int:
+    """
+    Normalize a lesson's weeks field into a bitmask where bit n-1 means teaching week n.
+    Date ranges can only be placed when the semester start is known (see
+    calendar_semester_start); without it they, like missing or malformed values,
+    are treated as running every week.
+    """
+    try:
+        if isinstance(weeks, list) and weeks:
+            numbers = weeks
+        elif isinstance(weeks, dict) and isinstance(weeks.get("weeks"), list) and weeks["weeks"]:
+            numbers = weeks["weeks"]
+        elif isinstance(weeks, dict) and semester_start is not None:
+            numbers = _date_range_weeks(weeks, semester_start)
+        else:
+            return ALL_WEEKS
+
+        mask = 0
+        for week in numbers:
+            if 1 <= int(week) <= TEACHING_WEEKS:
+                mask |= 1 << (int(week) - 1)
+        return mask or ALL_WEEKS
+    except (KeyError, TypeError, ValueError) as e:
+        print(f"Error parsing weeks {weeks}: {e}", file=sys.stderr)
+        return ALL_WEEKS
+
+
+class LessonTable:
+    """
+    Column-oriented view of every session in a request.
+
+    Each timetable row gets an integer id and its day, start and end minutes,
+    week bitmask, class bundle and (module, lessonType) group are stored in
+    parallel arrays, so conflict detection runs as per-day sweeps instead of
+    all-pairs loops over lesson dicts.
+    """
+
+    def __init__(self, bundles: List[Dict[str, Any]], time_to_minutes: Callable[[str], int],
+                 semester_start: Optional[date] = None):
+        self.bundles = bundles
+        self.groups: List[List[int]] = []
+        group_index: Dict[Tuple[str, str], int] = {}
+        bundle_group = []
+        for b, bundle in enumerate(bundles):
+            key = (bundle["moduleCode"], bundle["lessonType"])
+            if key not in group_index:
+                group_index[key] = len(self.groups)
+                self.groups.append([])
+            self.groups[group_index[key]].append(b)
+            bundle_group.append(group_index[key])
+        self.bundle_group = np.array(bundle_group, dtype=np.int32)
+
+        self.lessons: List[Dict[str, Any]] = []
+        rows_bundle = []
+        for b, bundle in enumerate(bundles):
+            for lesson in bundle["lessons"]:
+                self.lessons.append(lesson)
+                rows_bundle.append(b)
+
+        day_index = {day: d for d, day in enumerate(DAYS)}
+        days = []
+        for lesson in self.lessons:
+            day = lesson.get("day", "")
+            if day not in day_index:
+                day_index[day] = len(day_index)
+            days.append(day_index[day])
+        self.day_names = list(day_index)
+
+        self.bundle = np.array(rows_bundle, dtype=np.int32)
+        self.group = self.bundle_group[self.bundle] if len(self.bundle) else np.zeros(0, dtype=np.int32)
+        self.day = np.array(days, dtype=np.int16)
+        self.start = np.array([time_to_minutes(l.get("startTime", "0000")) for l in self.lessons], dtype=np.int32)
+        self.end = np.array([time_to_minutes(l.get("endTime", "0000")) for l in self.lessons], dtype=np.int32)
+        if semester_start is None:
+            semester_start = calendar_semester_start(self.lessons)
+        self.weeks = np.array([week_mask(l.get("weeks"), semester_start) for l in self.lessons], dtype=np.int32)
+        self.venue = [lesson.get("venue", "") for lesson in self.lessons]
+
+        # Row ids of each day, sorted by start then end time
+        self.day_rows: Dict[int, np.ndarray] = {}
+        for d in np.unique(self.day):
+            rows = np.nonzero(self.day == d)[0]
+            order = np.lexsort((self.end[rows], self.start[rows]))
+            self.day_rows[int(d)] = rows[order]
+
+    def __len__(self) -> int:
+        return len(self.lessons)
+
+    def time_overlap_cliques(self) -> List[List[int]]:
+        """
+        Maximal sets of rows that are all running at the same time of day on the same day.
+        Sweeps start/end events per day; lessons are half-open, so a lesson ending
+        at 1000 does not clash with one starting at 1000.
+        """
+        cliques = []
+        for rows in self.day_rows.values():
+            events = sorted(
+                [(int(self.end[r]), 0, int(r)) for r in rows] +
+                [(int(self.start[r]), 1, int(r)) for r in rows if self.end[r] > self.start[r]]
+            )
+            active = set()
+            grew = False
+            for _, is_start, r in events:
+                if is_start:
+                    active.add(r)
+                    grew = True
+                elif r in active:
+                    if grew and len(active) > 1:
+                        cliques.append(sorted(active))
+                    grew = False
+                    active.discard(r)
+        return cliques
+
+    def time_preference_penalties(self, preferred_time_slots: Dict[str, Dict[str, bool]]) -> np.ndarray:
+        """
+        Percentage (0-100) of each row's duration that falls in blocked time slots.
+        preferredTimeSlots is compiled once per day into a blocked-minute prefix sum,
+        so every penalty is a pair of array lookups.
+        """
+        durations = self.end - self.start
+        blocked = np.zeros(len(self), dtype=np.int64)
+        if not isinstance(preferred_time_slots, dict):
+            preferred_time_slots = {}
+
+        for d, rows in self.day_rows.items():
+            day_preferences = preferred_time_slots.get(self.day_names[d])
+            if not isinstance(day_preferences, dict) or all(day_preferences.values()):
+                continue
+            prefix = blocked_minute_prefix(day_preferences)
+            start = np.clip(self.start[rows], 0, MINUTES_PER_DAY)
+            end = np.clip(self.end[rows], start, MINUTES_PER_DAY)
+            blocked[rows] = prefix[end] - prefix[start]
+
+        return np.where(durations > 0, blocked * 100 // np.maximum(durations, 1), INVALID_LESSON_PENALTY)
+
+    def bundles_in_slots(self, slots_by_day: Dict[str, Set[str]]) -> Set[int]:
+        """Bundles with a lesson overlapping any of the given one-hour "HHMM" slots"""
+        touched = set()
+        for d, rows in self.day_rows.items():
+            for slot in slots_by_day.get(self.day_names[d], ()):
+                try:
+                    slot_start = int(slot[:2]) * 60 + int(slot[2:4])
+                except (TypeError, ValueError):
+                    continue
+                hit = rows[(self.start[rows] < slot_start + 60) & (self.end[rows] > slot_start)]
+                touched.update(int(b) for b in self.bundle[hit])
+        return touched
+
+    def overlap_cliques(self) -> List[List[int]]:
+        """
+        Sets of rows that genuinely clash: same time of day and at least one shared week.
+        A time clique whose rows all share a week is kept whole; otherwise it is split
+        into one sub-clique per week, which covers every clashing pair.
+        """
+        cliques = []
+        for rows in self.time_overlap_cliques():
+            masks = self.weeks[rows]
+            if np.bitwise_and.reduce(masks):
+                cliques.append(rows)
+                continue
+
+            seen = set()
+            for week in range(TEACHING_WEEKS):
+                members = tuple(r for r, mask in zip(rows, masks) if mask >> week & 1)
+                if len(members) > 1 and members not in seen:
+                    seen.add(members)
+                    cliques.append(list(members))
+        return cliques
+
+    def busy_spans_by_week(self) -> List[List[Tuple[int, int, int]]]:
+        """
+        For every distinct teaching-week pattern, the (bundle, start, end) spans a
+        class keeps a student busy, on one weekly axis where day d starts at minute
+        d * MINUTES_PER_DAY. Sessions of one class that overlap are merged, since
+        they are attended together; empty lessons are left out as they clash with
+        nothing. Weeks with the same spans share one list.
+        """
+        patterns = []
+        seen = set()
+        for week in range(TEACHING_WEEKS):
+            active = np.nonzero((self.weeks >> week) & 1 & (self.end > self.start))[0]
+            order = active[np.lexsort((self.start[active], self.day[active], self.bundle[active]))]
+
+            spans = []
+            for r in order:
+                b = int(self.bundle[r])
+                start = int(self.day[r]) * MINUTES_PER_DAY + int(self.start[r])
+                end = int(self.day[r]) * MINUTES_PER_DAY + int(self.end[r])
+                if spans and spans[-1][0] == b and start < spans[-1][2]:
+                    spans[-1] = (b, spans[-1][1], max(spans[-1][2], end))
+                else:
+                    spans.append((b, start, end))
+
+            key = tuple(spans)
+            if len(spans) > 1 and key not in seen:
+                seen.add(key)
+                patterns.append(spans)
+        return patterns
+
+    def bundle_overlap_cliques(self) -> List[List[int]]:
+        """Overlap cliques lifted to class bundles, dropping ones already covered by exactly-one"""
+        seen = set()
+        cliques = []
+        for rows in self.overlap_cliques():
+            members = frozenset(int(b) for b in self.bundle[rows])
+            if len(members) < 2 or members in seen:
+                continue
+            if len({int(self.bundle_group[b]) for b in members}) < 2:
+                continue
+            seen.add(members)
+            cliques.append(sorted(members))
+        return cliques
+
+    def back_to_back_pairs(self, max_gap: int) -> List[Tuple[int, int, int]]:
+        """Row pairs (earlier, later, gap) in a shared week where later starts 0..max_gap minutes after earlier ends"""
+        pairs = []
+        for rows in self.day_rows.values():
+            starts = self.start[rows]
+            lo = np.searchsorted(starts, self.end[rows], side='left')
+            hi = np.searchsorted(starts, self.end[rows] + max_gap, side='right')
+            for k in range(len(rows)):
+                i = int(rows[k])
+                for m in range(lo[k], hi[k]):
+                    j = int(rows[m])
+                    if self.group[i] != self.group[j] and self.weeks[i] & self.weeks[j]:
+                        pairs.append((i, j, int(self.start[j] - self.end[i])))
+        return pairs
+
+    def adjacent_start_pairs(self, min_diff: int, max_diff: int) -> List[Tuple[int, int]]:
+        """Neighbouring rows in each day's start-time order whose starts are min_diff..max_diff apart"""
+        pairs = []
+        for rows in self.day_rows.values():
+            diffs = np.diff(self.start[rows])
+            for k in np.nonzero((diffs >= min_diff) & (diffs <= max_diff))[0]:
+                i, j = int(rows[k]), int(rows[k + 1])
+                if self.group[i] != self.group[j] and self.weeks[i] & self.weeks[j]:
+                    pairs.append((i, j))
+        return pairs
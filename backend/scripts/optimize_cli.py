@@ -1,35 +1,172 @@
 #!/usr/bin/env python3
 
+import time
+STARTED = time.perf_counter()
+
+import os
 import sys
 import json
 import argparse
 import traceback
-from optimized_timetable_optimizer import TimetableOptimizer
+from framing import FramingError, decode, read_frame, write_frame
+from optimized_timetable_optimizer import FORMULATIONS, HEURISTIC_MODES, TimetableOptimizer, cp_model
+from profiling import PhaseTimer, profiled
+from result_cache import ResultCache
+
+IMPORT_SECONDS = time.perf_counter() - STARTED
+
+def startup_profile(args):
+    """Print the fixed cost of starting an optimizer process, phase by phase, as JSON"""
+    timer = PhaseTimer()
+    optimizer = TimetableOptimizer(args.locations, ResultCache(db_path=args.cache_db))
+    timer.lap("optimizerInit")
+    # OR-Tools is imported lazily, so this is what the first solve adds
+    cp_model.CpSolver
+    timer.lap("ortoolsImport")
+
+    phases = {"moduleImports": IMPORT_SECONDS * 1000}
+    phases.update({name: entry["wallSeconds"] * 1000 for name, entry in timer.phases.items()})
+    print(json.dumps({
+        "phasesMs": {name: round(ms, 1) for name, ms in phases.items()},
+        "optimizerInitMs": {name: round(entry["wallSeconds"] * 1000, 1)
+                            for name, entry in optimizer.startup_timer.phases.items()},
+        "totalMs": round((time.perf_counter() - STARTED) * 1000, 1),
+        "venues": len(optimizer.venue_distances.venues),
+    }, indent=2))
+
+def run_batch(args, data):
+    """Optimize every job in data["jobs"], streaming each result as it finishes"""
+    jobs = data.get('jobs') or []
+    if not jobs:
+        print("Error: No jobs found in input data", file=sys.stderr)
+        sys.exit(1)
+
+    # Options given at the top level apply to every job unless it overrides them
+    shared_solver = dict(data.get('solver', {}))
+    if args.time_limit is not None:
+        shared_solver['timeLimitSeconds'] = args.time_limit
+    if args.formulation:
+        shared_solver['formulation'] = args.formulation
+    if args.no_decompose:
+        shared_solver['decompose'] = False
+    if args.heuristic:
+        shared_solver['heuristic'] = args.heuristic
+    if args.top_k:
+        shared_solver['topK'] = args.top_k
+    jobs = [{**job, "solver": {**shared_solver, **(job.get('solver') or {})}} for job in jobs]
+
+    if args.verbose:
+        print(f"Loaded {len(jobs)} jobs", file=sys.stderr)
+
+    try:
+        optimizer = TimetableOptimizer(args.locations, ResultCache(db_path=args.cache_db))
+    except Exception as e:
+        print(f"Error initializing optimizer: {e}", file=sys.stderr)
+        if args.verbose:
+            traceback.print_exc(file=sys.stderr)
+        sys.exit(1)
+
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        def write_line(message):
+            out.write(json.dumps(message, separators=(',', ':')) + "\n")
+            out.flush()
+
+        with profiled(args.profile):
+            batch = optimizer.optimize_batch(
+                jobs, max_workers=args.workers,
+                on_result=lambda job_id, result: write_line({"type": "job", "id": job_id, **result}))
+        write_line({"type": "batch", **batch["stats"]})
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+def read_input(args):
+    """The request: a JSON file, JSON on stdin for '-', or one frame on stdin with --framed"""
+    if args.input_file != '-':
+        with open(args.input_file, 'r') as f:
+            return json.load(f)
+    if not args.framed:
+        return json.load(sys.stdin)
+
+    payload = read_frame(sys.stdin.buffer)
+    if payload is None:
+        raise FramingError("No request frame on stdin")
+    return decode(payload)
 
 def main():
     parser = argparse.ArgumentParser(description='Optimize university timetable')
-    parser.add_argument('input_file', help='JSON file containing modules and constraints')
+    parser.add_argument('input_file', nargs='?', default='-',
+                        help='JSON file containing modules and constraints (default: - for stdin)')
     parser.add_argument('-o', '--output', help='Output file (default: stdout)')
     parser.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
     parser.add_argument('--locations', default='./venues.json', help='Locations file path')
+    parser.add_argument('--cache-db', default=os.environ.get('OPTIMIZER_CACHE_DB'),
+                        help='SQLite file for the persistent result cache (default: $OPTIMIZER_CACHE_DB)')
+    parser.add_argument('--time-limit', type=float, help='Solver time limit in seconds (default: 120)')
+    parser.add_argument('--formulation', choices=FORMULATIONS,
+                        help='How clashes are modelled (default: cliques)')
+    parser.add_argument('--no-decompose', action='store_true',
+                        help='Solve one model instead of one per independent group of classes')
+    parser.add_argument('--heuristic', choices=HEURISTIC_MODES,
+                        help='Local search timetable: hint CP-SAT with it (default), skip it, or return only it')
+    parser.add_argument('--top-k', type=int, help='Also find the next best distinct timetables, up to this many in all '
+                             '(listed under "timetables" in the --stream result)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Write improving solutions and the final result to stdout as newline-delimited JSON')
+    parser.add_argument('--framed', action='store_true',
+                        help='Like --stream, but read the request from stdin and write every message as a '
+                             'length-prefixed frame (see framing.py)')
+    parser.add_argument('--batch', action='store_true',
+                        help='Input holds {"jobs": [...]}; write one JSON line per finished job, then a summary')
+    parser.add_argument('--workers', type=int, help='Solver processes for --batch (default: one per CPU)')
+    parser.add_argument('--profile', metavar='PATH',
+                        help='Profile the run into PATH: pyinstrument HTML for .html, cProfile stats otherwise')
+    parser.add_argument('--startup-profile', action='store_true',
+                        help='Report module import, optimizer start-up and OR-Tools import times as JSON '
+                             'instead of optimizing')
     
     args = parser.parse_args()
+    if args.startup_profile:
+        startup_profile(args)
+        return
+    if args.framed:
+        if args.batch:
+            parser.error("--framed cannot be combined with --batch")
+        args.input_file = '-'
+        # Frames are the only thing allowed on stdout; stray prints go to stderr
+        protocol_out = sys.stdout.buffer
+        sys.stdout = sys.stderr
     
     try:
         # Read input file
         try:
-            with open(args.input_file, 'r') as f:
-                data = json.load(f)
+            data = read_input(args)
         except FileNotFoundError:
             print(f"Error: Input file {args.input_file} not found", file=sys.stderr)
             sys.exit(1)
-        except json.JSONDecodeError as e:
-            print(f"Error: Invalid JSON in input file - {e}", file=sys.stderr)
+        except (FramingError, ValueError) as e:
+            print(f"Error: Invalid JSON in input - {e}", file=sys.stderr)
             sys.exit(1)
         
+        if args.batch:
+            run_batch(args, data)
+            return
+        
         # Extract modules and constraints
         modules = data.get('modules', {})
         constraints = data.get('constraints', {})
+        solver_options = data.get('solver', {})
+        if args.time_limit is not None:
+            solver_options['timeLimitSeconds'] = args.time_limit
+        if args.formulation:
+            solver_options['formulation'] = args.formulation
+        if args.no_decompose:
+            solver_options['decompose'] = False
+        if args.heuristic:
+            solver_options['heuristic'] = args.heuristic
+        if args.top_k:
+            solver_options['topK'] = args.top_k
         
         if args.verbose:
             print(f"Loaded {len(modules)} modules", file=sys.stderr)
@@ -46,7 +183,7 @@ def main():
         
         # Initialize optimizer
         try:
-            optimizer = TimetableOptimizer(args.locations)
+            optimizer = TimetableOptimizer(args.locations, ResultCache(db_path=args.cache_db))
         except Exception as e:
             print(f"Error initializing optimizer: {e}", file=sys.stderr)
             if args.verbose:
@@ -56,9 +193,29 @@ def main():
         if args.verbose:
             print("Starting optimization...", file=sys.stderr)
         
+        def write_line(message):
+            print(json.dumps(message, separators=(',', ':')), flush=True)
+
         # Run optimization
         try:
-            result = optimizer.optimize_timetable(modules, constraints)
+            if args.framed:
+                with profiled(args.profile):
+                    result = optimizer.optimize(
+                        modules, constraints, solver_options,
+                        on_incumbent=lambda incumbent: write_frame(protocol_out, {"type": "incumbent", **incumbent}))
+                write_frame(protocol_out, {"type": "result", **result})
+                return
+            if args.stream:
+                with profiled(args.profile):
+                    result = optimizer.optimize(modules, constraints, solver_options,
+                                                on_incumbent=lambda incumbent: write_line({"type": "incumbent", **incumbent}))
+                write_line({"type": "result", **result})
+                return
+            with profiled(args.profile):
+                envelope = optimizer.optimize(modules, constraints, solver_options)
+            if args.verbose:
+                print(f"Stats: {json.dumps(envelope.get('stats', {}))}", file=sys.stderr)
+            result = envelope["modules"]
         except Exception as e:
             print(f"Error during optimization: {e}", file=sys.stderr)
             if args.verbose:
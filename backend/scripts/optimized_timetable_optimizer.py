@@ -1,129 +1,370 @@
+import functools
+import importlib.util
 import json
-import math
+import os
 import sys
-from typing import Dict, List, Any, Optional
-from ortools.sat.python import cp_model
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import date
+import threading
+import time
+from typing import Callable, Dict, List, Any, Optional, Set, Tuple
+import numpy as np
+from profiling import PhaseTimer
+from heuristic_solver import DEFAULT_TIME_BUDGET_SECONDS, LocalSearch
+from lesson_table import INVALID_LESSON_PENALTY, MINUTES_PER_DAY, LessonTable, blocked_minute_prefix, blocked_slots
+from result_cache import ResultCache, module_fingerprint, request_key
+from venue_distances import VenueDistanceMatrix
 
-class TimetableOptimizer:
-    def __init__(self, locations_file: str = './venues.json'):
-        try:
-            with open(locations_file, 'r') as f:
-                self.locations = json.load(f)
-            print(f"Loaded {len(self.locations)} venue locations from {locations_file}", file=sys.stderr)
-        except FileNotFoundError:
-            print(f"Warning: {locations_file} not found. Using default locations.", file=sys.stderr)
-            self.locations = {}
-        except Exception as e:
-            print(f"Error loading venues file: {e}", file=sys.stderr)
-            self.locations = {}
-            
-        self._distance_cache = {}
-        self._precompute_distances()
+# Part of every result cache key; bump it whenever a change to the model
+# could change which timetable is returned for the same request.
+MODEL_VERSION = "7"
 
-    def _precompute_distances(self):
-        if not self.locations:
-            print("No venue data available, skipping distance computation", file=sys.stderr)
-            return
-            
-        venues = list(self.locations.keys())
-        print(f"Pre-computing distances for {len(venues)} venues...", file=sys.stderr)
-        
-        for i, venue1 in enumerate(venues):
-            for j, venue2 in enumerate(venues):
-                if i <= j:
-                    if venue1 == venue2:
-                        distance = 0
-                    else:
-                        try:
-                            distance = self._get_venue_distance(venue1, venue2)
-                        except Exception as e:
-                            print(f"Error calculating distance between {venue1} and {venue2}: {e}", file=sys.stderr)
-                            distance = 500
-                    
-                    self._distance_cache[(venue1, venue2)] = distance
-                    self._distance_cache[(venue2, venue1)] = distance
-        
-        print(f"Distance matrix computed with {len(self._distance_cache)} entries", file=sys.stderr)
+DEFAULT_TIME_LIMIT_SECONDS = 120.0
+DEADLINE_SAFETY_SECONDS = 1.0  # Left for extracting and serializing the result
+PREPARED_CACHE_SIZE = 16  # Module sets whose prepared structures are kept for reuse
+FORMULATIONS = ("cliques", "intervals")  # How clashes are modelled, see build_model()
+# solver_options["heuristic"]: skip the local search (heuristic_solver), use its
+# clash-free timetable as the first incumbent and as hints ("hint", the default),
+# or return it as a FEASIBLE result without running CP-SAT ("only").
+# "heuristicSeconds" bounds the search; results then carry
+# "heuristic": {"objective", "clashes", "wallSeconds"}.
+HEURISTIC_MODES = ("off", "hint", "only")
+OBJECTIVE_MODES = ("weighted", "lexicographic")  # How the objective terms are combined, see solve_model()
+OBJECTIVE_STAGES = ("preference", "travel", "compactness")  # Objective terms, highest priority first
+DOMINATES, EQUIVALENT = 1, 2  # PreparedProblem.compare_classes outcomes
+HINT_STORE_SIZE = 512  # Modules whose most recently chosen classes are kept as warm-start hints
 
-    def _get_venue_distance(self, venue1: str, venue2: str) -> float:
-        """Calculate distance between two venues with error handling"""
-        if venue1 not in self.locations or venue2 not in self.locations:
-            return 1000
-            
-        venue1_data = self.locations[venue1]
-        venue2_data = self.locations[venue2]
-        
-        loc1 = None
-        loc2 = None
-        
-        if 'location' in venue1_data:
-            loc1 = venue1_data['location']
-        elif 'coordinates' in venue1_data:
-            loc1 = venue1_data['coordinates']
-        elif 'x' in venue1_data and 'y' in venue1_data:
-            loc1 = {'x': venue1_data['x'], 'y': venue1_data['y']}
-        
-        if 'location' in venue2_data:
-            loc2 = venue2_data['location']
-        elif 'coordinates' in venue2_data:
-            loc2 = venue2_data['coordinates']
-        elif 'x' in venue2_data and 'y' in venue2_data:
-            loc2 = {'x': venue2_data['x'], 'y': venue2_data['y']}
-        
-        if not loc1 or not loc2:
-            return 500
-        
-        try:
-            lon1 = loc1.get('x', 0)
-            lat1 = loc1.get('y', 0)
-            lon2 = loc2.get('x', 0)
-            lat2 = loc2.get('y', 0)
-            
-            return self._haversine_distance(lat1, lon1, lat2, lon2)
-        except Exception as e:
-            print(f"Error extracting coordinates: {e}", file=sys.stderr)
-            return 500
+# Objective weights, from the highest priority term to the lowest
+TIME_PREFERENCE_WEIGHT = 10000  # Per percent of a class spent in blocked time
+TRAVEL_WEIGHT = 100  # Per point of travel penalty between back-to-back classes
+COMMON_START_WEIGHT = 10  # Per lesson starting at a common start time
+CONSECUTIVE_WEIGHT = 5  # Per pair of lessons running one after the other
 
-    def calculate_distance(self, venue1: str, venue2: str) -> float:
-        cache_key = (venue1, venue2)
-        if cache_key in self._distance_cache:
-            return self._distance_cache[cache_key]
-        
-        if venue1 not in self.locations or venue2 not in self.locations:
-            return 1000
-        
-        if venue1 == venue2:
+COMMON_START_TIMES = [480, 540, 600, 660, 840, 900, 960, 1020]  # 8AM, 9AM, 10AM, 11AM, 2PM, 3PM, 4PM, 5PM
+
+
+def lazy_module(name: str):
+    """The named module, imported only when one of its attributes is first used"""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+# Importing OR-Tools takes about a third of a second, so processes that only
+# validate requests, answer from the result cache or run the heuristic skip it
+cp_model = lazy_module("ortools.sat.python.cp_model")
+
+
+def status_name(status: int) -> str:
+    """Name of a CP-SAT solve status, e.g. OPTIMAL"""
+    return cp_model.cp_model_pb2.CpSolverStatus.Name(status)
+
+
+def relative_gap(objective: float, bound: float) -> float:
+    """Distance between the incumbent and the best proven bound, relative to the incumbent"""
+    return abs(bound - objective) / max(1.0, abs(objective))
+
+
+def improving_only(on_incumbent: Callable[[Dict[str, Any]], None]) -> Callable[[Dict[str, Any]], None]:
+    """
+    Wrap an incumbent callback so it only sees incumbents better than every
+    earlier one, whether they came from the heuristic or from CP-SAT, so callers
+    that run out of time can keep the latest
+    """
+    lock = threading.Lock()
+    best: List[float] = []
+
+    def report(incumbent: Dict[str, Any]):
+        with lock:
+            if best and incumbent["objective"] <= best[0]:
+                return
+            best[:] = [incumbent["objective"]]
+        on_incumbent(incumbent)
+
+    return report
+
+
+def split_workers(total: int, sizes: List[int]) -> List[int]:
+    """
+    Search workers for each of several models solved side by side: at least one
+    each, the rest in proportion to size with largest-remainder rounding, so the
+    shares add up to total. With more models than workers each gets one, and
+    only total of them may run at once.
+    """
+    if len(sizes) >= total:
+        return [1] * len(sizes)
+    spare = total - len(sizes)
+    quotas = [spare * size / sum(sizes) for size in sizes]
+    shares = [int(quota) for quota in quotas]
+    by_remainder = sorted(range(len(sizes)), key=lambda i: quotas[i] - shares[i], reverse=True)
+    for i in by_remainder[:spare - sum(shares)]:
+        shares[i] += 1
+    return [1 + share for share in shares]
+
+
+def combined_status(statuses: List[int]) -> int:
+    """CP-SAT status of a problem solved as independent parts"""
+    for status in (cp_model.INFEASIBLE, cp_model.MODEL_INVALID):
+        if status in statuses:
+            return status
+    if all(status == cp_model.OPTIMAL for status in statuses):
+        return cp_model.OPTIMAL
+    if all(status in (cp_model.OPTIMAL, cp_model.FEASIBLE) for status in statuses):
+        return cp_model.FEASIBLE
+    return cp_model.UNKNOWN
+
+
+@functools.lru_cache(maxsize=None)
+def incumbent_callback_class() -> type:
+    """
+    The IncumbentCallback class, defined on first use because subclassing the
+    CP-SAT callback needs OR-Tools imported
+    """
+
+    class IncumbentCallback(cp_model.CpSolverSolutionCallback):
+        """Reports every improving solution CP-SAT finds while the search is still running"""
+
+        def __init__(self, bundle_vars: Dict[int, Any], on_solution: Callable[[Set[int], float, float, float], None]):
+            super().__init__()
+            self._bundle_vars = bundle_vars
+            self._on_solution = on_solution
+
+        def on_solution_callback(self):
+            selected = {b for b, var in self._bundle_vars.items() if self.Value(var)}
+            self._on_solution(selected, self.ObjectiveValue(), self.BestObjectiveBound(), self.WallTime())
+
+    return IncumbentCallback
+
+
+class ModelPart:
+    """A set of groups sharing no model term with any other group, and the terms among them"""
+
+    def __init__(self, groups: List[int]):
+        self.groups = groups
+        self.cliques: List[List[int]] = []
+        self.travel_pairs: List[Tuple[int, int, int]] = []
+        self.consecutive_pairs: List[Tuple[int, int, int]] = []
+
+
+class BuiltModel:
+    """
+    A CP-SAT model for one ModelPart: its class variables by bundle, and the
+    objective split into (name, weight, expression) stages from the highest
+    priority to the lowest. The model maximizes the weighted sum of the stages.
+    """
+
+    def __init__(self, model: "cp_model.CpModel", bundle_vars: Dict[int, Any], stages: List[Tuple[str, int, Any]]):
+        self.model = model
+        self.bundle_vars = bundle_vars
+        self.stages = stages
+
+
+class PreparedProblem:
+    """
+    The parts of a model that depend only on the modules being taken, not on a
+    student's time preferences: class bundles, the lesson table, overlap cliques
+    and the travel, common start and consecutive class terms. Students taking
+    the same modules share one.
+    """
+
+    def __init__(self, bundles: List[Dict[str, Any]], table: LessonTable, overlap_cliques: List[List[int]],
+                 travel_penalties: Dict[Tuple[int, int], int], common_start_counts: List[int],
+                 consecutive_bonuses: Dict[Tuple[int, int], int]):
+        self.bundles = bundles
+        self.table = table
+        self.overlap_cliques = overlap_cliques
+        self.travel_penalties = travel_penalties
+        self.common_start_counts = common_start_counts
+        self.consecutive_bonuses = consecutive_bonuses
+
+        # Bundles linked to each bundle by a clash, travel or consecutive class term
+        self.bundle_neighbours: List[Set[int]] = [set() for _ in bundles]
+        for members in list(overlap_cliques) + list(travel_penalties) + list(consecutive_bonuses):
+            for b in members:
+                self.bundle_neighbours[b].update(members)
+                self.bundle_neighbours[b].discard(b)
+
+        # Per-bundle views of the pairwise terms, used by presolve()
+        self.clashes: List[Set[int]] = [set() for _ in bundles]
+        for clique in overlap_cliques:
+            for b in clique:
+                self.clashes[b].update(c for c in clique if table.bundle_group[c] != table.bundle_group[b])
+        self.travel_by_bundle: List[Dict[int, int]] = [{} for _ in bundles]
+        for (b1, b2), penalty in travel_penalties.items():
+            self.travel_by_bundle[b1][b2] = self.travel_by_bundle[b2][b1] = penalty
+        self.consecutive_by_bundle: List[Dict[int, int]] = [{} for _ in bundles]
+        for (b1, b2), count in consecutive_bonuses.items():
+            self.consecutive_by_bundle[b1][b2] = self.consecutive_by_bundle[b2][b1] = count
+
+        # Objective contribution of each pair of classes chosen together, used by the heuristic
+        self.pair_scores: List[Dict[int, int]] = [
+            {c: CONSECUTIVE_WEIGHT * self.consecutive_by_bundle[b].get(c, 0) - TRAVEL_WEIGHT * penalty
+             for c, penalty in self.travel_by_bundle[b].items()} for b in range(len(bundles))]
+        for b, consecutive in enumerate(self.consecutive_by_bundle):
+            for c, count in consecutive.items():
+                self.pair_scores[b].setdefault(c, CONSECUTIVE_WEIGHT * count)
+
+        self._parts: Dict[bool, List[ModelPart]] = {}
+        self._busy_spans: Optional[List[List[Tuple[int, int, int]]]] = None
+
+    def parts(self, decompose: bool = True) -> List[ModelPart]:
+        """
+        The connected components of the group interaction graph, where two
+        (module, lessonType) groups interact when any of their classes share a
+        clash, travel or consecutive class term. Components can be solved as
+        separate models and their optima combined (see solve_parts). Without
+        decompose (solver_options["decompose"] = False, or topK > 1), one part.
+        """
+        decompose = bool(decompose)
+        if decompose not in self._parts:
+            group_of = self.table.bundle_group.tolist()
+            root = list(range(len(self.table.groups)))
+
+            def find(g):
+                while root[g] != g:
+                    root[g] = root[root[g]]
+                    g = root[g]
+                return g
+
+            if decompose:
+                for b, neighbours in enumerate(self.bundle_neighbours):
+                    for n in neighbours:
+                        root[find(group_of[b])] = find(group_of[n])
+            else:
+                root = [0] * len(root)
+
+            index: Dict[int, int] = {}
+            parts: List[ModelPart] = []
+            for g in range(len(self.table.groups)):
+                r = find(g)
+                if r not in index:
+                    index[r] = len(parts)
+                    parts.append(ModelPart([]))
+                parts[index[r]].groups.append(g)
+
+            def part_of(b):
+                return parts[index[find(group_of[b])]]
+
+            for clique in self.overlap_cliques:
+                part_of(clique[0]).cliques.append(clique)
+            for (b1, b2), penalty in self.travel_penalties.items():
+                part_of(b1).travel_pairs.append((b1, b2, penalty))
+            for (b1, b2), count in self.consecutive_bonuses.items():
+                part_of(b1).consecutive_pairs.append((b1, b2, count))
+            self._parts[decompose] = parts
+        return self._parts[decompose]
+
+    def busy_spans(self) -> List[List[Tuple[int, int, int]]]:
+        """LessonTable.busy_spans_by_week, computed once"""
+        if self._busy_spans is None:
+            self._busy_spans = self.table.busy_spans_by_week()
+        return self._busy_spans
+
+    def class_scores(self, time_penalties: List[int]) -> List[int]:
+        """Objective contribution of choosing each class on its own"""
+        return [COMMON_START_WEIGHT * common - TIME_PREFERENCE_WEIGHT * penalty
+                for penalty, common in zip(time_penalties, self.common_start_counts)]
+
+    def objective_of(self, selected: Set[int], class_scores: List[int]) -> int:
+        """Weighted objective of a set of chosen classes, as the CP-SAT model would score it"""
+        objective = sum(class_scores[b] for b in selected)
+        objective += sum(score for b in selected for c, score in self.pair_scores[b].items()
+                         if c in selected and c > b)
+        return objective
+
+    def compare_classes(self, a: int, b: int, time_penalties: List[int]) -> int:
+        """
+        DOMINATES if class a is at least as good as class b of the same group on every
+        objective term and clashes with nothing b does not, EQUIVALENT if the two are
+        interchangeable, 0 otherwise.
+        """
+        if time_penalties[a] > time_penalties[b] or self.common_start_counts[a] < self.common_start_counts[b]:
             return 0
-        
-        distance = self._get_venue_distance(venue1, venue2)
-        
-        self._distance_cache[(venue1, venue2)] = distance
-        self._distance_cache[(venue2, venue1)] = distance
-        
-        return distance
-    
-    def _haversine_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-        """Calculate haversine distance with error handling"""
-        try:
-            R = 6371000
-            
-            lat1_rad = math.radians(float(lat1))
-            lon1_rad = math.radians(float(lon1))
-            lat2_rad = math.radians(float(lat2))
-            lon2_rad = math.radians(float(lon2))
-            
-            dlat = lat2_rad - lat1_rad
-            dlon = lon2_rad - lon1_rad
-            
-            a = (math.sin(dlat / 2) ** 2 + 
-                 math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2) ** 2)
-            c = 2 * math.asin(math.sqrt(a))
-            
-            distance = R * c
-            return distance
-        except Exception as e:
-            print(f"Error in haversine calculation: {e}", file=sys.stderr)
-            return 500
+        if not self.clashes[a] <= self.clashes[b]:
+            return 0
+        travel_a, travel_b = self.travel_by_bundle[a], self.travel_by_bundle[b]
+        if any(penalty > travel_b.get(c, 0) for c, penalty in travel_a.items()):
+            return 0
+        consecutive_a, consecutive_b = self.consecutive_by_bundle[a], self.consecutive_by_bundle[b]
+        if any(count > consecutive_a.get(c, 0) for c, count in consecutive_b.items()):
+            return 0
+
+        if (time_penalties[a] == time_penalties[b] and self.common_start_counts[a] == self.common_start_counts[b]
+                and self.clashes[a] == self.clashes[b] and travel_a == travel_b and consecutive_a == consecutive_b):
+            return EQUIVALENT
+        return DOMINATES
+
+    def presolve(self, time_penalties: List[int]) -> Tuple[List[bool], Dict[int, int], Dict[int, List[int]]]:
+        """
+        Drop classes that can never be needed. Within a group, a class that another
+        class dominates can be swapped for it in any timetable without breaking a clash
+        or lowering the objective, so only undominated classes get a variable; of a set
+        of equivalent classes one is kept and the rest are its alternatives.
+
+        Returns (kept, replacement, alternatives): whether each bundle is kept, the
+        kept bundle standing in for each dropped one, and the bundles equivalent to
+        each kept one. Results list the equivalent classNos under "alternatives".
+        optimize() skips this with solver_options["presolve"] = False, and when
+        topK > 1, as the next best timetables may need the dropped classes.
+        """
+        kept = [True] * len(self.bundles)
+        replacement: Dict[int, int] = {}
+        alternatives: Dict[int, List[int]] = {}
+        for members in self.table.groups:
+            order = sorted(members, key=lambda b: (time_penalties[b], len(self.clashes[b]),
+                                                   -self.common_start_counts[b], b))
+            survivors: List[int] = []
+            for b in order:
+                for a in survivors:
+                    relation = self.compare_classes(a, b, time_penalties)
+                    if relation:
+                        kept[b] = False
+                        replacement[b] = a
+                        if relation == EQUIVALENT:
+                            alternatives.setdefault(a, []).append(b)
+                        break
+                else:
+                    # The sort order is only a heuristic, so b may beat classes kept before it
+                    for a in [a for a in survivors if self.compare_classes(b, a, time_penalties)]:
+                        survivors.remove(a)
+                        kept[a] = False
+                        replacement[a] = b
+                        alternatives.pop(a, None)
+                    survivors.append(b)
+
+        for b in replacement:
+            while not kept[replacement[b]]:
+                replacement[b] = replacement[replacement[b]]
+        return kept, replacement, alternatives
+
+
+class TimetableOptimizer:
+    def __init__(self, locations_file: str = './venues.json', result_cache: Optional[ResultCache] = None):
+        self.locations_file = locations_file
+        self.startup_timer = PhaseTimer()
+        self.venue_distances = VenueDistanceMatrix(locations_file, timer=self.startup_timer)
+        self._prepared: "OrderedDict[str, PreparedProblem]" = OrderedDict()
+        self._hints: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+        if result_cache is None:
+            result_cache = ResultCache(db_path=os.environ.get("OPTIMIZER_CACHE_DB") or None)
+        self.result_cache = result_cache
+
+    @property
+    def locations(self) -> Dict[str, Any]:
+        return self.venue_distances.locations
+
+    def calculate_distance(self, venue1: str, venue2: str) -> Optional[float]:
+        return self.venue_distances.distance(venue1, venue2)
 
     def time_to_minutes(self, time_str: str) -> int:
         """Convert time string to minutes with error handling"""
@@ -144,42 +385,26 @@ class TimetableOptimizer:
 
     def calculate_time_preference_penalty(self, lesson: Dict[str, Any], preferred_time_slots: Dict[str, Dict[str, bool]]) -> int:
         """
-        Calculate penalty for lessons that fall in blocked time slots.
+        Calculate penalty for a single lesson that falls in blocked time slots.
         Returns 0 for fully available time, higher values for blocked times.
+        The optimizer itself uses LessonTable.time_preference_penalties, which
+        computes the same value for every lesson in one pass.
         """
         try:
-            lesson_day = lesson.get("day", "")
-            lesson_start_time = lesson.get("startTime", "0000")
-            lesson_end_time = lesson.get("endTime", "0000")
-            
-            lesson_start = self.time_to_minutes(lesson_start_time)
-            lesson_end = self.time_to_minutes(lesson_end_time)
-            
-            day_preferences = preferred_time_slots.get(lesson_day, {})
-            
-            blocked_minutes = 0
+            lesson_start = self.time_to_minutes(lesson.get("startTime", "0000"))
+            lesson_end = self.time_to_minutes(lesson.get("endTime", "0000"))
             total_lesson_minutes = lesson_end - lesson_start
             
             if total_lesson_minutes <= 0:
-                return 1000  # Heavy penalty for invalid lessons
+                return INVALID_LESSON_PENALTY  # Heavy penalty for invalid lessons
             
-            # Check each hour during the lesson
-            current_time = lesson_start
-            while current_time < lesson_end:
-                hours = current_time // 60
-                time_slot = f"{hours:02d}00"
-                
-                # If this time slot is NOT available (False or missing), add penalty
-                if not day_preferences.get(time_slot, True):  # Default to available if not specified
-                    slot_end = current_time + 60
-                    actual_blocked = min(slot_end, lesson_end) - current_time
-                    blocked_minutes += actual_blocked
-                
-                current_time += 60
+            prefix = blocked_minute_prefix(preferred_time_slots.get(lesson.get("day", ""), {}))
+            start = min(max(lesson_start, 0), MINUTES_PER_DAY)
+            end = min(max(lesson_end, start), MINUTES_PER_DAY)
+            blocked_minutes = int(prefix[end] - prefix[start])
             
             # Calculate penalty percentage (0-100, higher is worse)
-            penalty_percentage = (blocked_minutes / total_lesson_minutes) * 100
-            return int(penalty_percentage)
+            return blocked_minutes * 100 // total_lesson_minutes
             
         except Exception as e:
             print(f"Error calculating time penalty: {e}", file=sys.stderr)
@@ -197,225 +422,925 @@ class TimetableOptimizer:
             return 0  # Same venue
         
         distance_meters = self.calculate_distance(venue1, venue2)
+        if not distance_meters:
+            return 0  # Same building, or a venue that cannot be placed
+        
         walking_speed_mps = 1.4  # 1.4 m/s = ~5 km/h walking speed
         travel_time_minutes = (distance_meters / walking_speed_mps) / 60
         
         return travel_time_minutes + 2  # Add 2 minutes buffer
 
+    def build_class_bundles(self, modules: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Group timetable rows into class bundles keyed by (module, lessonType, classNo).
+        A student attends every session of the class they pick, so a bundle is the
+        unit of choice in the model.
+        """
+        bundles = []
+        bundle_index = {}
+        for module_code, data in modules.items():
+            if 'timetable' not in data or not data['timetable']:
+                continue
+
+            for lesson in data["timetable"]:
+                key = (module_code, lesson["lessonType"], lesson["classNo"])
+                if key not in bundle_index:
+                    bundle_index[key] = len(bundles)
+                    bundles.append({
+                        "moduleCode": module_code,
+                        "lessonType": lesson["lessonType"],
+                        "classNo": lesson["classNo"],
+                        "lessons": []
+                    })
+                bundles[bundle_index[key]]["lessons"].append(lesson)
+
+        return bundles
+
+    def parse_semester_start(self, constraints: Dict[str, Any]) -> Optional[date]:
+        """
+        Monday of teaching week 1, used to place lessons whose weeks are given as
+        date ranges. Without one LessonTable looks the semester up in the
+        academic calendar (see lesson_table.calendar_semester_start).
+        """
+        semester_start = constraints.get("semesterStart")
+        if not semester_start:
+            return None
+        try:
+            return date.fromisoformat(semester_start)
+        except (TypeError, ValueError) as e:
+            print(f"Ignoring invalid semesterStart {semester_start}: {e}", file=sys.stderr)
+            return None
+
+    def select_modules(self, modules: Dict[str, Any], bundles: List[Dict[str, Any]], selected: Set[int]) -> Dict[str, Any]:
+        """Build the response timetable keeping only the lessons of the selected class bundles"""
+        selected_keys = {(bundles[b]["moduleCode"], bundles[b]["lessonType"], bundles[b]["classNo"])
+                         for b in selected}
+
+        optimized_modules = {}
+        for module_code, data in modules.items():
+            if 'timetable' not in data or not data['timetable']:
+                optimized_modules[module_code] = data
+                continue
+
+            optimized_modules[module_code] = {
+                "moduleCode": module_code,
+                "timetable": [lesson for lesson in data["timetable"]
+                              if (module_code, lesson["lessonType"], lesson["classNo"]) in selected_keys]
+            }
+        return optimized_modules
+
+    def selection_of(self, bundles: List[Dict[str, Any]], selected: Set[int]) -> Dict[str, Dict[str, str]]:
+        """Compact {moduleCode: {lessonType: classNo}} description of the selected bundles"""
+        selection = {}
+        for b in sorted(selected):
+            bundle = bundles[b]
+            selection.setdefault(bundle["moduleCode"], {})[bundle["lessonType"]] = bundle["classNo"]
+        return selection
+
+    def solver_time_limit(self, solver_options: Dict[str, Any]) -> float:
+        """Seconds a request may run for, honouring both timeLimitSeconds and an absolute deadlineMs"""
+        time_limit = float(solver_options.get("timeLimitSeconds", DEFAULT_TIME_LIMIT_SECONDS))
+        deadline_ms = solver_options.get("deadlineMs")
+        if deadline_ms:
+            remaining = float(deadline_ms) / 1000 - time.time() - DEADLINE_SAFETY_SECONDS
+            time_limit = min(time_limit, remaining)
+        return max(time_limit, 0.1)
+
     def optimize_timetable(self, modules: Dict[str, Any], constraints: Dict[str, Any]) -> Dict[str, Any]:
+        """Optimize and return only the timetable; falls back to the input modules on failure"""
+        return self.optimize(modules, constraints)["modules"]
+
+    def structure_key(self, modules: Dict[str, Any], constraints: Dict[str, Any]) -> str:
+        """Content hash of everything prepare() depends on: the modules, semester start, venues and model"""
+        return request_key(modules, {"semesterStart": constraints.get("semesterStart")},
+                           self.venue_distances.version, model_version=MODEL_VERSION)
+
+    def prepare(self, modules: Dict[str, Any], constraints: Dict[str, Any],
+                timer: Optional[PhaseTimer] = None) -> PreparedProblem:
+        """
+        Build the module-level structures for a request, reusing a recent one
+        for the same module set if there is one.
+        """
+        timer = timer or PhaseTimer()
+        key = self.structure_key(modules, constraints)
+        prepared = self._prepared.get(key)
+        if prepared is not None:
+            self._prepared.move_to_end(key)
+            timer.lap("preparedReuse")
+            return prepared
+
+        bundles = self.build_class_bundles(modules)
+        table = LessonTable(bundles, self.time_to_minutes, self.parse_semester_start(constraints))
+        print(f"Processing {len(table)} total lessons in {len(bundles)} classes", file=sys.stderr)
+        timer.lap("lessonFlattening")
+
+        overlap_cliques = table.bundle_overlap_cliques()
+        print(f"Found {len(overlap_cliques)} overlapping class cliques", file=sys.stderr)
+
+        # Travel only matters between lessons in different building clusters
+        clusters = [self.venue_distances.cluster_of(venue) for venue in table.venue]
+        travel_penalties = {}
+        for i, j, time_gap in table.back_to_back_pairs(30):  # Up to 30 minutes gap
+            if clusters[i] < 0 or clusters[j] < 0 or clusters[i] == clusters[j]:
+                continue
+            travel_time = self.calculate_travel_time(table.lessons[i], table.lessons[j])
+            if travel_time > time_gap:
+                b1, b2 = int(table.bundle[i]), int(table.bundle[j])
+                pair = (min(b1, b2), max(b1, b2))
+                penalty = int((travel_time - time_gap) * 10)  # Scale penalty
+                travel_penalties[pair] = travel_penalties.get(pair, 0) + penalty
+        print(f"Found {len(travel_penalties)} potential travel issues", file=sys.stderr)
+
+        common_start_counts = np.bincount(table.bundle[np.isin(table.start, COMMON_START_TIMES)],
+                                          minlength=len(bundles))
+
+        consecutive_bonuses = {}
+        for i, j in table.adjacent_start_pairs(60, 120):  # Lessons 1-2 hours apart get a small bonus
+            b1, b2 = int(table.bundle[i]), int(table.bundle[j])
+            pair = (min(b1, b2), max(b1, b2))
+            consecutive_bonuses[pair] = consecutive_bonuses.get(pair, 0) + 1
+
+        prepared = PreparedProblem(bundles, table, overlap_cliques, travel_penalties,
+                                   common_start_counts.tolist(), consecutive_bonuses)
+        self._prepared[key] = prepared
+        while len(self._prepared) > PREPARED_CACHE_SIZE:
+            self._prepared.popitem(last=False)
+        timer.lap("conflictDetection")
+        return prepared
+
+    def explicit_previous(self, solver_options: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """solver_options["previous"] = {"selection", "constraints"} when it is well formed"""
+        previous = solver_options.get("previous")
+        if isinstance(previous, dict) and isinstance(previous.get("selection"), dict):
+            return previous
+        return None
+
+    def previous_solution(self, modules: Dict[str, Any], solver_options: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """
+        Classes an earlier solve chose for each module, and the constraints it chose them under,
+        as {moduleCode: {"classes": {lessonType: classNo}, "constraints": {...}}}, used to
+        warm-start the search. Taken from solver_options["previous"] when given (a result's
+        "selection" and the request's constraints), otherwise from this optimizer's
+        most recent solve of each unchanged module. The latter may come from another
+        user's request, so it is only good for hints, never for pinning classes.
+        """
+        previous = self.explicit_previous(solver_options)
+        if previous is not None:
+            previous_constraints = previous.get("constraints")
+            if not isinstance(previous_constraints, dict):
+                previous_constraints = {}  # Unknown: every changed slot counts as an edit
+            return {module_code: {"classes": classes, "constraints": previous_constraints}
+                    for module_code, classes in previous["selection"].items()
+                    if module_code in modules and isinstance(classes, dict)}
+
+        solutions = {}
+        for module_code, data in modules.items():
+            entry = self._hints.get(module_code)
+            if entry is not None and entry["fingerprint"] == module_fingerprint(data):
+                solutions[module_code] = entry
+        return solutions
+
+    def remember_solution(self, modules: Dict[str, Any], constraints: Dict[str, Any],
+                          selection: Dict[str, Dict[str, str]]):
+        """Keep the chosen classes of each module as hints for the next request that includes it"""
+        solved_under = {"preferredTimeSlots": constraints.get("preferredTimeSlots", {}),
+                        "semesterStart": constraints.get("semesterStart")}
+        for module_code, classes in selection.items():
+            self._hints[module_code] = {"fingerprint": module_fingerprint(modules[module_code]),
+                                        "classes": classes, "constraints": solved_under}
+            self._hints.move_to_end(module_code)
+        while len(self._hints) > HINT_STORE_SIZE:
+            self._hints.popitem(last=False)
+
+    def changed_slots(self, constraints: Dict[str, Any],
+                      previous_constraints: Dict[str, Any]) -> Optional[Dict[str, Set[str]]]:
+        """Slots blocked in one request but not the other, by day; None if the change affects every lesson"""
+        if constraints.get("semesterStart") != previous_constraints.get("semesterStart"):
+            return None
+        current = constraints.get("preferredTimeSlots") or {}
+        previous = previous_constraints.get("preferredTimeSlots") or {}
+        changed = {}
+        for day in set(current) | set(previous):
+            slots = blocked_slots(current.get(day)) ^ blocked_slots(previous.get(day))
+            if slots:
+                changed[day] = slots
+        return changed
+
+    def affected_groups(self, prepared: PreparedProblem, constraints: Dict[str, Any],
+                        previous: Dict[str, Dict[str, Any]]) -> Set[int]:
+        """
+        (module, lessonType) groups an edit could change. A group is affected when it
+        has no usable previous class, or when its previous class or one of its other
+        classes overlaps a slot whose preference changed. Groups whose previous class
+        is linked by a clash, travel or consecutive term to any class of an affected
+        group are freed as well, so affected groups can move to every one of their
+        classes. With solver_options["fixUnchanged"] and an explicit previous,
+        groups further away stay pinned, so the result is not guaranteed to be the
+        best timetable for the new constraints: it is reported FEASIBLE at best,
+        without a bound, and not cached.
+        """
+        table = prepared.table
+        chosen = {}
+        affected = set()
+        touched_by = {}
+        for g, members in enumerate(table.groups):
+            bundle = prepared.bundles[members[0]]
+            entry = previous.get(bundle["moduleCode"])
+            class_no = entry["classes"].get(bundle["lessonType"]) if entry else None
+            b = next((b for b in members if prepared.bundles[b]["classNo"] == class_no), None)
+            if b is None:
+                affected.add(g)  # New groups have to fit around the classes that are kept
+                continue
+            chosen[g] = b
+
+            key = id(entry["constraints"])
+            if key not in touched_by:
+                slots = self.changed_slots(constraints, entry["constraints"])
+                touched_by[key] = None if slots is None else table.bundles_in_slots(slots)
+            touched = touched_by[key]
+            if touched is None or touched.intersection(members):
+                affected.add(g)
+
+        chosen_group = {b: g for g, b in chosen.items()}
+        neighbours = {chosen_group[n] for g in affected for b in table.groups[g]
+                      for n in prepared.bundle_neighbours[b] if n in chosen_group}
+        return affected | neighbours
+
+    def collect_stats(self, timer: PhaseTimer, model_stats: Optional[Dict[str, Any]] = None,
+                      solver_stats: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Structured account of a request: wall and CPU seconds per phase (cacheLookup,
+        lessonFlattening, conflictDetection, objectiveBuild, solve, extraction), model
+        size, CP-SAT response statistics, result cache counters, and the optimizer's
+        one-off startup phases (venueLoad, distancePrecompute).
+        """
+        return {
+            "phases": timer.summary(),
+            "model": model_stats or {},
+            "solver": solver_stats or {},
+            "cache": self.result_cache.stats(),
+            "startup": self.startup_timer.summary(),
+        }
+
+    def optimize(self, modules: Dict[str, Any], constraints: Dict[str, Any],
+                 solver_options: Optional[Dict[str, Any]] = None,
+                 on_incumbent: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 prepared: Optional[PreparedProblem] = None) -> Dict[str, Any]:
+        """
+        Optimize a timetable and describe how good the answer is.
+
+        Returns {"modules", "status", "objective", "bestBound", "gap", "wallTime",
+        "cached", "stats"} (see collect_stats); successful results add "selection"
+        and "alternatives" (see fill_solution). Optimal results are cached by request
+        content, so repeating a request returns instantly with "cached": true.
+        on_incumbent, if given, is called with each improving timetable as a compact
+        "selection" (see improving_only). prepared, if given, must come from
+        prepare() for the same modules.
+
+        Options are described where they are applied: timeLimitSeconds and
+        deadlineMs in solver_time_limit, which bounds the whole request;
+        numSearchWorkers in search_workers; previous and fixUnchanged in
+        previous_solution and affected_groups; presolve in PreparedProblem.presolve;
+        decompose in PreparedProblem.parts; formulation in build_model; heuristic
+        and heuristicSeconds at HEURISTIC_MODES; topK and minDistance in
+        next_timetables; constraints["objectiveMode"] in solve_model.
+        """
+        solver_options = solver_options or {}
+        # One deadline for the whole request: the solve, further timetables and any re-solve share it
+        deadline = time.time() + self.solver_time_limit(solver_options)
+        if on_incumbent is not None:
+            on_incumbent = improving_only(on_incumbent)
+        timer = PhaseTimer()
+        result = {"modules": modules, "status": "UNKNOWN", "objective": None,
+                  "bestBound": None, "gap": None, "wallTime": 0.0, "cached": False}
+
+        cache_key = request_key(modules, constraints, self.venue_distances.version, solver_options, MODEL_VERSION)
+        cached = self.result_cache.get(cache_key)
+        timer.lap("cacheLookup")
+        if cached is not None:
+            print(f"Result cache hit for request {cache_key[:12]}", file=sys.stderr)
+            cached["cached"] = True
+            cached["stats"] = self.collect_stats(timer)
+            return cached
+
         try:
-            model = cp_model.CpModel()
-            
             preferred_time_slots = constraints.get("preferredTimeSlots", {})
             
-            all_lessons = []
-            for module_code, data in modules.items():
-                if 'timetable' not in data or not data['timetable']:
-                    continue
-                    
-                for lesson in data["timetable"]:
-                    lesson_copy = lesson.copy()
-                    lesson_copy["moduleCode"] = module_code
-                    all_lessons.append(lesson_copy)
-            
-            if not all_lessons:
+            if prepared is None:
+                prepared = self.prepare(modules, constraints, timer)
+            bundles = prepared.bundles
+            table = prepared.table
+            travel_penalties = prepared.travel_penalties
+            if not bundles:
                 print("No lessons found in modules", file=sys.stderr)
-                return modules
+                result["status"] = "NO_LESSONS"
+                result["stats"] = self.collect_stats(timer)
+                return result
             
-            print(f"Processing {len(all_lessons)} total lessons", file=sys.stderr)
-            
-            # Create decision variables
-            lesson_vars = {}
-            for i, lesson in enumerate(all_lessons):
-                lesson_id = f"{lesson['moduleCode']}_{lesson['lessonType']}_{lesson['classNo']}_{i}"
-                lesson_vars[lesson_id] = model.NewBoolVar(lesson_id)
-            
-            # CONSTRAINT 1: Exactly one lesson per module per lesson type (HARD)
-            for module_code, data in modules.items():
-                if 'timetable' not in data or not data['timetable']:
-                    continue
-                    
-                lesson_types = set()
-                for lesson in data["timetable"]:
-                    lesson_types.add(lesson["lessonType"])
-                
-                for lesson_type in lesson_types:
-                    lesson_options = []
-                    for i, lesson in enumerate(all_lessons):
-                        if (lesson["moduleCode"] == module_code and 
-                            lesson["lessonType"] == lesson_type):
-                            lesson_id = f"{lesson['moduleCode']}_{lesson['lessonType']}_{lesson['classNo']}_{i}"
-                            lesson_options.append(lesson_vars[lesson_id])
-                    
-                    if lesson_options:
-                        model.AddExactlyOne(lesson_options)
-            
-            # CONSTRAINT 2: No time overlaps (HARD)
-            overlapping_pairs = []
-            for i, lesson1 in enumerate(all_lessons):
-                for j, lesson2 in enumerate(all_lessons):
-                    if i >= j or lesson1["day"] != lesson2["day"]:
-                        continue
-                    
-                    start1 = self.time_to_minutes(lesson1["startTime"])
-                    end1 = self.time_to_minutes(lesson1["endTime"])
-                    start2 = self.time_to_minutes(lesson2["startTime"])
-                    end2 = self.time_to_minutes(lesson2["endTime"])
-                    
-                    if (start1 < end2 and start2 < end1):
-                        lesson1_id = f"{lesson1['moduleCode']}_{lesson1['lessonType']}_{lesson1['classNo']}_{i}"
-                        lesson2_id = f"{lesson2['moduleCode']}_{lesson2['lessonType']}_{lesson2['classNo']}_{j}"
-                        overlapping_pairs.append((lesson1_id, lesson2_id))
-            
-            print(f"Found {len(overlapping_pairs)} overlapping pairs", file=sys.stderr)
-            
-            for lesson1_id, lesson2_id in overlapping_pairs:
-                model.Add(lesson_vars[lesson1_id] + lesson_vars[lesson2_id] <= 1)
+            lesson_time_penalties = table.time_preference_penalties(preferred_time_slots)
+            bundle_time_penalties = np.bincount(table.bundle, weights=lesson_time_penalties,
+                                                minlength=len(bundles)).astype(np.int64).tolist()
+
+            # Drop dominated classes and collapse equivalent ones before building the model, unless
+            # further timetables are wanted: the next best ones may well use the dropped classes
+            top_k = max(1, int(solver_options.get("topK", 1)))
+            kept, replacement, alternatives = [True] * len(bundles), {}, {}
+            if solver_options.get("presolve", True) and top_k == 1:
+                kept, replacement, alternatives = prepared.presolve(bundle_time_penalties)
+
+            formulation = solver_options.get("formulation", "cliques")
+            if formulation not in FORMULATIONS:
+                print(f"Unknown formulation {formulation}, using cliques", file=sys.stderr)
+                formulation = "cliques"
+
+            objective_mode = constraints.get("objectiveMode", "weighted")
+            if objective_mode not in OBJECTIVE_MODES:
+                print(f"Unknown objective mode {objective_mode}, using weighted", file=sys.stderr)
+                objective_mode = "weighted"
+            class_scores = prepared.class_scores(bundle_time_penalties)
             
-            # CONSTRAINT 3: Travel time constraints (SOFT via objective)
-            travel_penalty_pairs = []
-            for i, lesson1 in enumerate(all_lessons):
-                for j, lesson2 in enumerate(all_lessons):
-                    if i >= j or lesson1["day"] != lesson2["day"]:
+            # Warm start from an earlier solution, optionally keeping unaffected classes
+            hints: Dict[int, int] = {}
+            pinned: Set[int] = set()
+            previous = self.previous_solution(modules, solver_options)
+            if previous:
+                # Only the caller's own previous timetable may pin classes
+                fix_unchanged = solver_options.get("fixUnchanged") and self.explicit_previous(solver_options)
+                affected = self.affected_groups(prepared, constraints, previous) if fix_unchanged else None
+                for g, members in enumerate(table.groups):
+                    bundle = bundles[members[0]]
+                    class_no = previous.get(bundle["moduleCode"], {}).get("classes", {}).get(bundle["lessonType"])
+                    chosen = next((b for b in members if bundles[b]["classNo"] == class_no), None)
+                    if chosen is None:
                         continue
-                    
-                    start1 = self.time_to_minutes(lesson1["startTime"])
-                    end1 = self.time_to_minutes(lesson1["endTime"])
-                    start2 = self.time_to_minutes(lesson2["startTime"])
-                    end2 = self.time_to_minutes(lesson2["endTime"])
-                    
-                    # Check if lessons are back-to-back and require travel
-                    time_gap = start2 - end1
-                    if 0 <= time_gap <= 30:  # Up to 30 minutes gap
-                        travel_time = self.calculate_travel_time(lesson1, lesson2)
-                        if travel_time > time_gap:
-                            lesson1_id = f"{lesson1['moduleCode']}_{lesson1['lessonType']}_{lesson1['classNo']}_{i}"
-                            lesson2_id = f"{lesson2['moduleCode']}_{lesson2['lessonType']}_{lesson2['classNo']}_{j}"
-                            penalty = int((travel_time - time_gap) * 10)  # Scale penalty
-                            travel_penalty_pairs.append((lesson1_id, lesson2_id, penalty))
-            
-            print(f"Found {len(travel_penalty_pairs)} potential travel issues", file=sys.stderr)
-            
-            # OBJECTIVE: Minimize time preference violations (PRIMARY)
-            objective_terms = []
-            
-            # 1. TIME PREFERENCE PENALTIES (HIGHEST PRIORITY)
-            time_preference_weight = 10000  # Very high weight
-            for i, lesson in enumerate(all_lessons):
-                lesson_id = f"{lesson['moduleCode']}_{lesson['lessonType']}_{lesson['classNo']}_{i}"
-                time_penalty = self.calculate_time_preference_penalty(lesson, preferred_time_slots)
-                
-                if time_penalty > 0:
-                    # Minimize penalty (subtract from objective)
-                    objective_terms.append(lesson_vars[lesson_id] * (-time_penalty * time_preference_weight))
-            
-            # 2. TRAVEL TIME PENALTIES (MEDIUM PRIORITY)
-            travel_weight = 100
-            for lesson1_id, lesson2_id, penalty in travel_penalty_pairs:
-                # Create variable for when both lessons are selected
-                both_selected = model.NewBoolVar(f"travel_{lesson1_id}_{lesson2_id}")
-                model.Add(both_selected >= lesson_vars[lesson1_id] + lesson_vars[lesson2_id] - 1)
-                objective_terms.append(both_selected * (-penalty * travel_weight))
+                    hints[g] = replacement.get(chosen, chosen)
+                    if affected is not None and g not in affected:
+                        pinned.add(g)
+                result["incremental"] = {"hintedGroups": len(hints), "fixedGroups": len(pinned),
+                                         "groups": len(table.groups)}
+                print(f"Warm start: {len(hints)} groups hinted, {len(pinned)} kept fixed", file=sys.stderr)
             
-            # 3. PREFERENCE FOR COMMON TIME SLOTS (LOW PRIORITY)
-            common_time_weight = 10
-            common_start_times = [480, 540, 600, 660, 840, 900, 960, 1020]  # 8AM, 9AM, 10AM, 11AM, 2PM, 3PM, 4PM, 5PM
-            for i, lesson in enumerate(all_lessons):
-                lesson_id = f"{lesson['moduleCode']}_{lesson['lessonType']}_{lesson['classNo']}_{i}"
-                start_time = self.time_to_minutes(lesson["startTime"])
-                
-                if start_time in common_start_times:
-                    objective_terms.append(lesson_vars[lesson_id] * common_time_weight)
-            
-            # 4. MINIMIZE GAPS BETWEEN CLASSES (LOW PRIORITY)
-            gap_weight = 5
-            daily_lessons = {}
-            for i, lesson in enumerate(all_lessons):
-                day = lesson["day"]
-                if day not in daily_lessons:
-                    daily_lessons[day] = []
-                lesson_id = f"{lesson['moduleCode']}_{lesson['lessonType']}_{lesson['classNo']}_{i}"
-                daily_lessons[day].append((lesson_id, self.time_to_minutes(lesson["startTime"])))
-            
-            # Bonus for consecutive lessons
-            for day, day_lessons in daily_lessons.items():
-                day_lessons.sort(key=lambda x: x[1])  # Sort by start time
-                for i in range(len(day_lessons) - 1):
-                    lesson1_id, time1 = day_lessons[i]
-                    lesson2_id, time2 = day_lessons[i + 1]
-                    
-                    # If lessons are 1-2 hours apart, give small bonus
-                    time_diff = time2 - time1
-                    if 60 <= time_diff <= 120:
-                        consecutive_var = model.NewBoolVar(f"consecutive_{lesson1_id}_{lesson2_id}")
-                        model.Add(consecutive_var >= lesson_vars[lesson1_id] + lesson_vars[lesson2_id] - 1)
-                        objective_terms.append(consecutive_var * gap_weight)
+            # Greedy and local search: an instant preview, and a starting point for CP-SAT
+            heuristic = solver_options.get("heuristic", "hint")
+            if heuristic not in HEURISTIC_MODES:
+                print(f"Unknown heuristic mode {heuristic}, using hint", file=sys.stderr)
+                heuristic = "hint"
+            if heuristic != "off":
+                timer.lap("objectiveBuild")
+                candidates = [[hints[g]] if g in pinned else [b for b in members if kept[b]]
+                              for g, members in enumerate(table.groups)]
+                search = LocalSearch(candidates, class_scores, prepared.pair_scores, prepared.clashes)
+                selected, objective, clashing = search.solve(
+                    hints, float(solver_options.get("heuristicSeconds", DEFAULT_TIME_BUDGET_SECONDS)))
+                timer.lap("heuristic")
+                result["heuristic"] = {"objective": objective, "clashes": clashing,
+                                       "wallSeconds": round(timer.phases["heuristic"]["wallSeconds"], 4)}
+                print(f"Heuristic timetable: objective {objective}, {clashing} clashes", file=sys.stderr)
+
+                if not clashing:
+                    if heuristic == "only":
+                        result["status"] = "FEASIBLE"
+                        result["objective"] = float(objective)
+                        self.fill_solution(result, modules, constraints, bundles, selected, alternatives)
+                        timer.lap("extraction")
+                        result["stats"] = self.collect_stats(timer)
+                        return result
+                    if on_incumbent is not None:
+                        on_incumbent({
+                            "selection": self.selection_of(bundles, selected),
+                            "status": "INCUMBENT",
+                            "objective": float(objective),
+                            "bestBound": None,
+                            "gap": None,
+                            "wallTime": result["heuristic"]["wallSeconds"],
+                        })
+                    for b in selected:
+                        hints[int(table.bundle_group[b])] = b
+                elif heuristic == "only":
+                    print("Heuristic could not avoid every clash, running the full solve", file=sys.stderr)
+
+            # Groups that share no clash, travel or consecutive term are solved as separate models,
+            # except when further timetables are wanted: those are re-solves of one whole model
+            parts = prepared.parts(solver_options.get("decompose", True) and top_k == 1)
+            models = [self.build_model(prepared, part, kept, bundle_time_penalties, formulation, hints, pinned)
+                      for part in parts]
             
-            # Set objective to maximize (minimize negative penalties)
-            if objective_terms:
-                model.Maximize(sum(objective_terms))
+            timer.lap("objectiveBuild")
+            protos = [built.model.Proto() for built in models]
+            model_stats = {
+                "lessons": len(table),
+                "bundles": len(bundles),
+                "equivalentClasses": sum(len(equivalent) for equivalent in alternatives.values()),
+                "dominatedClasses": len(replacement) - sum(len(equivalent) for equivalent in alternatives.values()),
+                "components": len(models),
+                "variables": sum(len(proto.variables) for proto in protos),
+                "constraints": sum(len(proto.constraints) for proto in protos),
+            }
             
-            # Solve with increased time limit for better solutions
-            solver = cp_model.CpSolver()
-            solver.parameters.max_time_in_seconds = 120.0  # 2 minutes
-            solver.parameters.num_search_workers = 4  # Use multiple threads
-            status = solver.Solve(model)
+            # Solve within the caller's time budget, streaming improving solutions.
+            # With pinned groups CP-SAT's bound only covers timetables keeping the pinned classes.
+            report = on_incumbent
+            if pinned and on_incumbent is not None:
+                report = lambda incumbent: on_incumbent({**incumbent, "bestBound": None, "gap": None})
+            stage_log: List[Dict[str, Any]] = []
+            # Further timetables each get the same share of the time left as the first one
+            solve_deadline = time.time() + (deadline - time.time()) / top_k
+            outcomes = self.solve_parts(models, solve_deadline, solver_options, bundles, objective_mode,
+                                        lambda chosen: prepared.objective_of(chosen, class_scores),
+                                        report, stage_log)
+            status = combined_status([status for status, _ in outcomes])
+            if pinned and status == cp_model.INFEASIBLE:
+                print("Kept classes no longer fit together, re-solving every group", file=sys.stderr)
+                retry_options = {**solver_options, "fixUnchanged": False,
+                                 "deadlineMs": (deadline + DEADLINE_SAFETY_SECONDS) * 1000}
+                return self.optimize(modules, constraints, retry_options, on_incumbent, prepared)
+            if pinned and status == cp_model.OPTIMAL:
+                status = cp_model.FEASIBLE  # Optimal only among timetables that keep the pinned classes
+            timer.lap("solve")
+            result["status"] = status_name(status)
+            result["wallTime"] = timer.phases["solve"]["wallSeconds"]
             
             # Extract solution
-            optimized_modules = {}
             if status in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
-                total_time_penalty = 0
-                total_travel_penalty = 0
-                selected_lessons_count = 0
-                
-                for module_code, data in modules.items():
-                    if 'timetable' not in data or not data['timetable']:
-                        optimized_modules[module_code] = data
-                        continue
-                        
-                    optimized_modules[module_code] = {
-                        "moduleCode": module_code,
-                        "timetable": []
-                    }
-                    
-                    for i, lesson in enumerate(all_lessons):
-                        if lesson["moduleCode"] != module_code:
-                            continue
-                            
-                        lesson_id = f"{lesson['moduleCode']}_{lesson['lessonType']}_{lesson['classNo']}_{i}"
-                        if lesson_id in lesson_vars and solver.Value(lesson_vars[lesson_id]):
-                            clean_lesson = {k: v for k, v in lesson.items() if k != "moduleCode"}
-                            optimized_modules[module_code]["timetable"].append(clean_lesson)
-                            
-                            # Calculate statistics
-                            time_penalty = self.calculate_time_preference_penalty(lesson, preferred_time_slots)
-                            total_time_penalty += time_penalty
-                            selected_lessons_count += 1
-                
-                # Calculate travel penalties for selected lessons
-                for lesson1_id, lesson2_id, penalty in travel_penalty_pairs:
-                    if (lesson1_id in lesson_vars and lesson2_id in lesson_vars and 
-                        solver.Value(lesson_vars[lesson1_id]) and solver.Value(lesson_vars[lesson2_id])):
-                        total_travel_penalty += penalty
+                selected = {b for built, (_, solver) in zip(models, outcomes)
+                            for b, var in built.bundle_vars.items() if solver.Value(var)}
+
+                total_time_penalty = sum(bundle_time_penalties[b] for b in selected)
+                total_travel_penalty = sum(penalty for (b1, b2), penalty in travel_penalties.items()
+                                           if b1 in selected and b2 in selected)
+                selected_lessons_count = sum(len(bundles[b]["lessons"]) for b in selected)
+
+                if objective_mode == "lexicographic":
+                    # Stage values are not on the weighted scale; only a proven lexicographic optimum has a bound
+                    result["objective"] = float(prepared.objective_of(selected, class_scores))
+                    result["bestBound"] = result["objective"] if status == cp_model.OPTIMAL else None
+                    result["gap"] = 0.0 if status == cp_model.OPTIMAL else None
+                    result["stages"] = self.merge_stages(stage_log)
+                else:
+                    result["objective"] = sum(solver.ObjectiveValue() for _, solver in outcomes)
+                    result["bestBound"] = sum(solver.BestObjectiveBound() for _, solver in outcomes)
+                    result["gap"] = relative_gap(result["objective"], result["bestBound"])
+                if pinned:
+                    result["bestBound"] = result["gap"] = None
                 
                 avg_time_penalty = total_time_penalty / selected_lessons_count if selected_lessons_count > 0 else 0
                 
-                print(f"Optimization complete: {selected_lessons_count} lessons selected", file=sys.stderr)
+                print(f"Optimization complete: {len(selected)} classes ({selected_lessons_count} lessons) selected", file=sys.stderr)
                 print(f"Average time preference penalty: {avg_time_penalty:.1f}% (lower is better)", file=sys.stderr)
                 print(f"Total travel penalty: {total_travel_penalty}", file=sys.stderr)
-                print(f"Solution status: {'OPTIMAL' if status == cp_model.OPTIMAL else 'FEASIBLE'}", file=sys.stderr)
+                if result["gap"] is not None:
+                    print(f"Solution status: {result['status']} (gap {result['gap']:.2%})", file=sys.stderr)
+                else:
+                    print(f"Solution status: {result['status']}", file=sys.stderr)
+
+                self.fill_solution(result, modules, constraints, bundles, selected, alternatives)
                 
             else:
-                print(f"Optimization failed with status: {status}", file=sys.stderr)
-                return modules
+                print(f"Optimization failed with status: {result['status']}", file=sys.stderr)
             
-            return optimized_modules
+            timer.lap("extraction")
+            if top_k > 1 and result.get("selection"):
+                result["timetables"] = [{"selection": result["selection"], "objective": result["objective"],
+                                         "status": result["status"]}]
+                result["timetables"] += self.next_timetables(models[0], selected, top_k - 1,
+                                                             int(solver_options.get("minDistance", 1)),
+                                                             deadline, solver_options, bundles, objective_mode,
+                                                             lambda chosen: prepared.objective_of(chosen, class_scores))
+                timer.lap("alternatives")
+                print(f"Found {len(result['timetables'])} of {top_k} requested timetables", file=sys.stderr)
+            result["stats"] = self.collect_stats(timer, model_stats, {
+                "status": result["status"],
+                "wallTime": result["wallTime"],
+                "userTime": sum(solver.UserTime() for _, solver in outcomes),
+                "objectiveMode": objective_mode,
+                "branches": sum(solver.NumBranches() for _, solver in outcomes),
+                "conflicts": sum(solver.NumConflicts() for _, solver in outcomes),
+                "booleans": sum(solver.NumBooleans() for _, solver in outcomes),
+                "objective": result["objective"],
+                "bestBound": result["bestBound"],
+                "gap": result["gap"],
+            })
+            if status == cp_model.OPTIMAL and not pinned:
+                self.result_cache.put(cache_key, result)
+            return result
             
         except Exception as e:
             print(f"Error in optimize_timetable: {e}", file=sys.stderr)
             import traceback
             traceback.print_exc(file=sys.stderr)
-            return modules
+            result["status"] = "ERROR"
+            result["stats"] = self.collect_stats(timer)
+            return result
+
+    def fill_solution(self, result: Dict[str, Any], modules: Dict[str, Any], constraints: Dict[str, Any],
+                      bundles: List[Dict[str, Any]], selected: Set[int], alternatives: Dict[int, List[int]]):
+        """Put the chosen classes, their selection and alternatives into result, and remember them as hints"""
+        result["modules"] = self.select_modules(modules, bundles, selected)
+        result["selection"] = self.selection_of(bundles, selected)
+        result["alternatives"] = {}
+        for b in sorted(selected):
+            if alternatives.get(b):
+                result["alternatives"].setdefault(bundles[b]["moduleCode"], {})[bundles[b]["lessonType"]] = \
+                    [bundles[a]["classNo"] for a in alternatives[b]]
+        self.remember_solution(modules, constraints, result["selection"])
+
+    def build_model(self, prepared: PreparedProblem, part: "ModelPart", kept: List[bool],
+                    time_penalties: List[int], formulation: str, hints: Dict[int, int],
+                    pinned: Set[int]) -> BuiltModel:
+        """
+        CP-SAT model choosing one kept class for every group of part. formulation
+        picks how clashes are modelled: "cliques" posts an at-most-one per set of
+        classes running at the same time; "intervals" gives each class optional
+        interval variables and leaves clashes to one no-overlap constraint per week
+        pattern.
+        """
+        model = cp_model.CpModel()
+        bundles = prepared.bundles
+        table = prepared.table
+
+        # Create decision variables, one per remaining class bundle
+        bundle_vars = {}
+        for g in part.groups:
+            for b in table.groups[g]:
+                if kept[b]:
+                    bundle = bundles[b]
+                    bundle_vars[b] = model.NewBoolVar(f"{bundle['moduleCode']}_{bundle['lessonType']}_{bundle['classNo']}")
+        
+        # CONSTRAINT 1: Exactly one class per module per lesson type (HARD)
+        for g in part.groups:
+            model.AddExactlyOne([bundle_vars[b] for b in table.groups[g] if kept[b]])
+        
+        # CONSTRAINT 2: No time overlaps between chosen classes (HARD)
+        if formulation == "intervals":
+            # One optional interval per busy span of a class, present when the
+            # class is chosen, and one no-overlap per distinct week pattern
+            intervals = {}
+            for spans in prepared.busy_spans():
+                week_intervals = []
+                for b, start, end in spans:
+                    if b not in bundle_vars:
+                        continue
+                    if (b, start, end) not in intervals:
+                        intervals[(b, start, end)] = model.NewOptionalFixedSizeIntervalVar(
+                            start, end - start, bundle_vars[b], f"busy_{b}_{start}")
+                    week_intervals.append(intervals[(b, start, end)])
+                if len(week_intervals) > 1:
+                    model.AddNoOverlap(week_intervals)
+        else:
+            for clique in part.cliques:
+                members = [bundle_vars[b] for b in clique if kept[b]]
+                if len(members) > 1:
+                    model.AddAtMostOne(members)
+        
+        # Warm start hints, and classes kept from the previous solution
+        for g in part.groups:
+            if g in hints:
+                for b in table.groups[g]:
+                    if kept[b]:
+                        model.AddHint(bundle_vars[b], int(b == hints[g]))
+                if g in pinned:
+                    model.Add(bundle_vars[hints[g]] == 1)
+        
+        # CONSTRAINT 3: Travel time constraints (SOFT via objective, pairs found in prepare)
+        
+        # OBJECTIVE: Minimize time preference violations (PRIMARY)
+        preference_terms, travel_terms, compactness_terms = [], [], []
+        
+        # 1. TIME PREFERENCE PENALTIES (HIGHEST PRIORITY)
+        for b, var in bundle_vars.items():
+            if time_penalties[b] > 0:
+                # Minimize penalty (subtract from objective)
+                preference_terms.append(var * -time_penalties[b])
+        
+        # 2. TRAVEL TIME PENALTIES (MEDIUM PRIORITY)
+        for b1, b2, penalty in part.travel_pairs:
+            if not (kept[b1] and kept[b2]):
+                continue
+            # Create variable for when both classes are selected
+            both_selected = model.NewBoolVar(f"travel_{b1}_{b2}")
+            if formulation == "intervals":
+                model.AddBoolOr([both_selected, bundle_vars[b1].Not(), bundle_vars[b2].Not()])
+            else:
+                model.Add(both_selected >= bundle_vars[b1] + bundle_vars[b2] - 1)
+            travel_terms.append(both_selected * -penalty)
+        
+        # 3. PREFERENCE FOR COMMON TIME SLOTS (LOW PRIORITY)
+        for b, var in bundle_vars.items():
+            if prepared.common_start_counts[b]:
+                compactness_terms.append(var * (COMMON_START_WEIGHT * prepared.common_start_counts[b]))
+        
+        # 4. MINIMIZE GAPS BETWEEN CLASSES (LOW PRIORITY)
+        for b1, b2, count in part.consecutive_pairs:
+            if not (kept[b1] and kept[b2]):
+                continue
+            # A bonus must only be earned when both classes are actually selected
+            consecutive_var = model.NewBoolVar(f"consecutive_{b1}_{b2}")
+            model.AddImplication(consecutive_var, bundle_vars[b1])
+            model.AddImplication(consecutive_var, bundle_vars[b2])
+            compactness_terms.append(consecutive_var * (CONSECUTIVE_WEIGHT * count))
+        
+        # Set objective to maximize (minimize negative penalties)
+        stages = list(zip(OBJECTIVE_STAGES, (TIME_PREFERENCE_WEIGHT, TRAVEL_WEIGHT, 1),
+                          (sum(preference_terms), sum(travel_terms), sum(compactness_terms))))
+        if preference_terms or travel_terms or compactness_terms:
+            model.Maximize(sum(weight * expression for _, weight, expression in stages))
+        return BuiltModel(model, bundle_vars, stages)
+
+    def search_workers(self, solver_options: Dict[str, Any]) -> int:
+        """CP-SAT search workers for a request: numSearchWorkers, or every CPU but at least 4"""
+        return int(solver_options.get("numSearchWorkers", max(4, os.cpu_count() or 1)))
+
+    def merge_stages(self, stage_log: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Combine the per-model entries of a lexicographic solve's stage log into one entry per stage"""
+        stages = []
+        for name in OBJECTIVE_STAGES:
+            entries = [entry for entry in stage_log if entry["stage"] == name]
+            if not entries:
+                continue
+            objectives = [entry["objective"] for entry in entries]
+            bounds = [entry["bestBound"] for entry in entries]
+            stages.append({
+                "stage": name,
+                "status": status_name(combined_status([entry["status"] for entry in entries])),
+                "objective": None if None in objectives else sum(objectives),
+                "bestBound": None if None in bounds else sum(bounds),
+                "wallTime": round(max(entry["wallTime"] for entry in entries), 4),
+            })
+        return stages
+
+    def solve_model(self, built: BuiltModel, objective_mode: str, time_limit: float, search_workers: int,
+                    callback: Optional["cp_model.CpSolverSolutionCallback"] = None,
+                    stage_log: Optional[List[Dict[str, Any]]] = None) -> Tuple[int, Any]:
+        """
+        Solve a built model and return (status, solver).
+
+        objective_mode is constraints["objectiveMode"]: "weighted" (default)
+        maximizes one weighted sum; "lexicographic" minimizes time preference
+        violations first, then travel given that, then maximizes compactness given
+        both. In lexicographic mode the objective stages are optimized one after another
+        on a copy of the model, each within an equal share of the time left. The
+        value a stage reaches becomes a lower bound for every later stage and its
+        solution their hint. The returned solver holds the last stage's solution;
+        the status is OPTIMAL only when every stage was. Each stage is appended to
+        stage_log as {"stage", "status", "objective", "bestBound", "wallTime"}.
+        Lexicographic results report the weighted objective of the timetable found,
+        a bound only once it is proven optimal, and the stages under "stages".
+        """
+        stages = [stage for stage in built.stages if not isinstance(stage[2], int)]
+        if objective_mode != "lexicographic" or not stages:
+            solver = cp_model.CpSolver()
+            solver.parameters.max_time_in_seconds = time_limit
+            solver.parameters.num_search_workers = search_workers
+            return solver.Solve(built.model, callback), solver
+
+        staged = cp_model.CpModel()
+        staged.CopyFrom(built.model)
+        deadline = time.time() + time_limit
+        best: Tuple[int, Any] = (cp_model.UNKNOWN, None)
+        for index, (name, _, expression) in enumerate(stages):
+            staged.Maximize(expression)
+            solver = cp_model.CpSolver()
+            solver.parameters.max_time_in_seconds = max((deadline - time.time()) / (len(stages) - index), 0.1)
+            solver.parameters.num_search_workers = search_workers
+            status = solver.Solve(staged, callback)
+            found = status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+            if stage_log is not None:
+                stage_log.append({"stage": name, "status": status,
+                                  "objective": solver.ObjectiveValue() if found else None,
+                                  "bestBound": solver.BestObjectiveBound() if found else None,
+                                  "wallTime": solver.WallTime()})
+            if not found:
+                if best[1] is None:
+                    return status, solver
+                # Out of time on a later stage: keep the earlier stage's timetable
+                return cp_model.FEASIBLE, best[1]
+            best = (cp_model.OPTIMAL if status == cp_model.OPTIMAL and best[0] != cp_model.FEASIBLE
+                    else cp_model.FEASIBLE, solver)
+
+            # Later stages may not give up anything this stage reached
+            staged.Add(expression >= round(solver.ObjectiveValue()))
+            staged.ClearHints()
+            for var in built.bundle_vars.values():
+                staged.AddHint(var, solver.Value(var))
+        return best
+
+    def next_timetables(self, built: BuiltModel, first: Set[int], count: int, min_distance: int, deadline: float,
+                        solver_options: Dict[str, Any], bundles: List[Dict[str, Any]], objective_mode: str,
+                        score: Callable[[Set[int]], float]) -> List[Dict[str, Any]]:
+        """
+        The next best timetables after first, best first, by re-solving the built
+        model with a no-good cut after each one: every timetable must choose a
+        different class from each earlier one in at least min_distance groups.
+        The re-solves share the time left before deadline equally; the search
+        stops early once no further timetable exists. score gives the weighted objective
+        of a timetable in lexicographic mode. optimize() asks for topK - 1 of them,
+        with min_distance from solver_options["minDistance"] (default 1), and lists
+        them after the returned timetable as "timetables": [{"selection",
+        "objective", "status"}].
+        """
+        model, bundle_vars = built.model, built.bundle_vars
+        timetables = []
+        chosen = first
+        for k in range(count):
+            model.Add(sum(bundle_vars[b] for b in chosen) <= len(chosen) - max(1, min_distance))
+            model.ClearHints()
+            for b, var in bundle_vars.items():
+                model.AddHint(var, int(b in chosen))
+
+            status, solver = self.solve_model(built, objective_mode,
+                                              max((deadline - time.time()) / (count - k), 0.1),
+                                              self.search_workers(solver_options))
+            if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+                break
+            chosen = {b for b, var in bundle_vars.items() if solver.Value(var)}
+            objective = score(chosen) if objective_mode == "lexicographic" else solver.ObjectiveValue()
+            timetables.append({"selection": self.selection_of(bundles, chosen), "objective": float(objective),
+                               "status": status_name(status)})
+        return timetables
+
+    def solve_parts(self, models: List[BuiltModel], deadline: float, solver_options: Dict[str, Any],
+                    bundles: List[Dict[str, Any]], objective_mode: str, score: Callable[[Set[int]], float],
+                    on_incumbent: Optional[Callable[[Dict[str, Any]], None]] = None,
+                    stage_log: Optional[List[Dict[str, Any]]] = None) -> List[Tuple[int, Any]]:
+        """
+        Solve independent models side by side and return (status, solver) for each.
+        The numSearchWorkers budget (default: every CPU, at least 4) is split
+        between the models by size (see split_workers), so no more CP-SAT workers
+        run at once than the budget allows; all models stop at deadline, and once every
+        model has a solution each improvement is reported as a merged incumbent.
+        Lexicographic incumbents are scored with score and carry no bound.
+        """
+        search_workers = self.search_workers(solver_options)
+        sizes = [len(built.bundle_vars) + 1 for built in models]
+        shares = split_workers(search_workers, sizes)
+
+        lock = threading.Lock()
+        latest: Dict[int, Tuple[Set[int], float, Optional[float]]] = {}
+        started = time.perf_counter()
+
+        def report(index, selected, objective, bound, wall_time):
+            with lock:
+                if objective_mode == "lexicographic":
+                    objective, bound = score(selected), None
+                latest[index] = (selected, objective, bound)
+                if on_incumbent is None or len(latest) < len(models):
+                    return
+                merged = set().union(*(entry[0] for entry in latest.values()))
+                objective = sum(entry[1] for entry in latest.values())
+                bounds = [entry[2] for entry in latest.values()]
+                bound = None if None in bounds else sum(bounds)
+                on_incumbent({
+                    "selection": self.selection_of(bundles, merged),
+                    "status": "INCUMBENT",
+                    "objective": float(objective),
+                    "bestBound": bound,
+                    "gap": None if bound is None else relative_gap(objective, bound),
+                    "wallTime": time.perf_counter() - started,
+                })
+
+        def solve(index):
+            built = models[index]
+            callback = incumbent_callback_class()(
+                built.bundle_vars, lambda selected, objective, bound, wall_time: report(index, selected, objective, bound, wall_time))
+            return self.solve_model(built, objective_mode, max(deadline - time.time(), 0.1),
+                                    shares[index], callback, stage_log)
+
+        if len(models) == 1:
+            return [solve(0)]
+
+        # Largest models first, so the long solves start straight away
+        order = sorted(range(len(models)), key=lambda index: -sizes[index])
+        with ThreadPoolExecutor(max_workers=min(len(models), search_workers)) as executor:
+            futures = {index: executor.submit(solve, index) for index in order}
+            return [futures[index].result() for index in range(len(models))]
+
+    def optimize_batch(self, jobs: List[Dict[str, Any]], max_workers: Optional[int] = None,
+                       on_result: Optional[Callable[[Any, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Optimize many independent jobs, such as every student in a cohort.
+
+        Each job is {"id", "modules", "constraints", "solver"}. Module-level
+        structures are prepared once per distinct module set and shared by every
+        job that uses it. Identical jobs (same cache key) are solved once and the
+        result given to each of them; the solves themselves run in a pool of
+        max_workers processes (default: one per CPU). on_result(job_id, result)
+        is called as each job finishes, in completion order.
+
+        Returns {"results": {job_id: result}, "stats": {...}} where stats reports
+        cache hits, distinct module sets and throughput. Every job is either
+        solved or a cache hit: answered from the result cache, or by the solve
+        of an identical job. Cache hits carry "cached": true.
+        """
+        started = time.perf_counter()
+        results: Dict[Any, Dict[str, Any]] = {}
+        cache_hits = 0
+
+        def finish(job_id, result):
+            nonlocal cache_hits
+            if result.get("cached"):
+                cache_hits += 1
+            results[job_id] = result
+            if on_result is not None:
+                on_result(job_id, result)
+
+        # Answer cached jobs straight away, solve each distinct request once,
+        # and prepare what is left once per module set
+        pending = []
+        waiting: Dict[str, List[Any]] = {}  # Job ids by cache key, in submission order
+        prepared_by_key: Dict[str, PreparedProblem] = {}
+        for index, job in enumerate(jobs):
+            job_id = job.get("id", index)
+            modules = job.get("modules") or {}
+            constraints = job.get("constraints") or {}
+            solver_options = dict(job.get("solver") or {})
+
+            cache_key = request_key(modules, constraints, self.venue_distances.version, solver_options, MODEL_VERSION)
+            if cache_key in waiting:
+                waiting[cache_key].append(job_id)
+                continue
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                cached["cached"] = True
+                finish(job_id, cached)
+                continue
+            waiting[cache_key] = [job_id]
+
+            structure_key = self.structure_key(modules, constraints)
+            if structure_key not in prepared_by_key:
+                prepared_by_key[structure_key] = self.prepare(modules, constraints)
+            pending.append((job_id, cache_key, structure_key, modules, constraints, solver_options))
+        prepare_seconds = time.perf_counter() - started
+
+        cpu_count = os.cpu_count() or 1
+        max_workers = max(1, min(max_workers or cpu_count, len(pending) or 1))
+        for _, _, _, _, _, solver_options in pending:
+            # Split the CPUs between concurrent solves instead of oversubscribing them
+            solver_options.setdefault("numSearchWorkers", max(1, cpu_count // max_workers))
+
+        def store(cache_key, result):
+            if result["status"] == "OPTIMAL":
+                self.result_cache.put(cache_key, result)
+            first, *duplicates = waiting[cache_key]
+            finish(first, result)
+            for job_id in duplicates:
+                finish(job_id, {**result, "cached": True})
+
+        if max_workers == 1:
+            for job_id, cache_key, structure_key, modules, constraints, solver_options in pending:
+                result = self.optimize(modules, constraints, solver_options,
+                                       prepared=prepared_by_key[structure_key])
+                store(cache_key, result)
+        else:
+            # Prepared structures go to each worker process once, not once per job
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_batch_worker,
+                                     initargs=(self.locations_file, prepared_by_key)) as executor:
+                futures = {
+                    executor.submit(_solve_batch_job, modules, constraints, solver_options, structure_key):
+                        (job_id, cache_key, modules)
+                    for job_id, cache_key, structure_key, modules, constraints, solver_options in pending
+                }
+                for future in as_completed(futures):
+                    job_id, cache_key, modules = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"Batch job {job_id} failed: {e}", file=sys.stderr)
+                        result = {"modules": modules, "status": "ERROR", "objective": None,
+                                  "bestBound": None, "gap": None, "wallTime": 0.0, "cached": False}
+                    store(cache_key, result)
+
+        wall_seconds = time.perf_counter() - started
+        stats = {
+            "jobs": len(jobs),
+            "solved": len(jobs) - cache_hits,
+            "cacheHits": cache_hits,
+            "distinctModuleSets": len(prepared_by_key),
+            "workers": max_workers,
+            "prepareSeconds": round(prepare_seconds, 3),
+            "wallSeconds": round(wall_seconds, 3),
+            "jobsPerSecond": round(len(jobs) / wall_seconds, 2) if wall_seconds > 0 else None,
+        }
+        print(f"Batch of {len(jobs)} jobs ({len(prepared_by_key)} module sets) "
+              f"finished in {wall_seconds:.2f}s", file=sys.stderr)
+        return {"results": results, "stats": stats}
+
+
+_batch_optimizer: Optional[TimetableOptimizer] = None
+_batch_prepared: Dict[str, PreparedProblem] = {}
+
+
+def _init_batch_worker(locations_file: str, prepared_by_key: Dict[str, PreparedProblem]):
+    """Process pool initializer: load venues once and keep the batch's prepared structures"""
+    global _batch_optimizer, _batch_prepared
+    _batch_optimizer = TimetableOptimizer(locations_file, ResultCache())
+    _batch_prepared = prepared_by_key
+
+
+def _solve_batch_job(modules: Dict[str, Any], constraints: Dict[str, Any],
+                     solver_options: Dict[str, Any], structure_key: str) -> Dict[str, Any]:
+    return _batch_optimizer.optimize(modules, constraints, solver_options,
+                                     prepared=_batch_prepared[structure_key])
+
 
 def main():
     """Test function with sample data"""
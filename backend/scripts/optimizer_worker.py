@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Long-lived optimizer worker.
+
+Loads the venue data and OR-Tools once, then serves optimization requests
+over stdin/stdout as length-prefixed JSON frames (see framing.py), one
+message per frame in each direction. stdout carries nothing but protocol
+frames; all logging goes to stderr.
+
+Request:   {"id": 1, "modules": {...}, "constraints": {...}, "solver": {"deadlineMs": ...}}
+Incumbent: {"id": 1, "type": "incumbent", "selection": {...}, "objective": ..., "gap": ...}
+Response:  {"id": 1, "ok": true, "result": {"modules": {...}, "status": "OPTIMAL", ...}, "cache": {...}}
+           {"id": 1, "ok": false, "error": "..."}
+
+Incumbents are streamed while the solver runs so the caller can answer with
+the best solution so far if its own deadline passes first.
+"""
+
+import argparse
+import os
+import sys
+import time
+import traceback
+from typing import Dict, Any, BinaryIO, Optional
+
+from framing import FramingError, decode, read_frame, write_frame
+from optimized_timetable_optimizer import TimetableOptimizer, cp_model
+from profiling import profiled
+from result_cache import ResultCache
+
+WARMUP_MODULES = {
+    "WARMUP": {
+        "timetable": [
+            {"lessonType": "Lecture", "classNo": "1", "day": "Monday",
+             "startTime": "1000", "endTime": "1200", "venue": "LT17"},
+            {"lessonType": "Lecture", "classNo": "2", "day": "Tuesday",
+             "startTime": "1000", "endTime": "1200", "venue": "LT17"},
+        ]
+    }
+}
+WARMUP_CONSTRAINTS = {"preferredTimeSlots": {"Monday": {"1000": False, "1100": False}}}
+
+
+def handle_request(optimizer: TimetableOptimizer, request: Dict[str, Any], out: BinaryIO,
+                   profile_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Run a single request, streaming incumbents to out, and wrap the outcome in a response message"""
+    request_id = request.get("id")
+    modules = request.get("modules") or {}
+    constraints = request.get("constraints") or {}
+    solver_options = request.get("solver") or {}
+
+    if not modules:
+        return {"id": request_id, "ok": False, "error": "No modules found in input data"}
+    if not constraints:
+        return {"id": request_id, "ok": False, "error": "No constraints found in input data"}
+
+    profile_path = None
+    if profile_dir:
+        profile_path = os.path.join(profile_dir, f"request_{os.getpid()}_{request_id}.prof")
+
+    try:
+        with profiled(profile_path):
+            result = optimizer.optimize(
+                modules, constraints, solver_options,
+                on_incumbent=lambda incumbent: write_frame(out, {"id": request_id, "type": "incumbent", **incumbent}))
+        return {"id": request_id, "ok": True, "result": result, "cache": optimizer.result_cache.stats()}
+    except Exception as e:
+        traceback.print_exc(file=sys.stderr)
+        return {"id": request_id, "ok": False, "error": f"{type(e).__name__}: {e}"}
+
+
+def serve(optimizer: TimetableOptimizer, instream: BinaryIO, out: BinaryIO, profile_dir: Optional[str] = None):
+    """Answer requests until stdin is closed"""
+    while True:
+        try:
+            payload = read_frame(instream)
+        except FramingError as e:
+            print(f"Stopping on a broken request stream: {e}", file=sys.stderr)
+            return
+        if payload is None:
+            return
+
+        try:
+            request = decode(payload)
+        except ValueError as e:
+            write_frame(out, {"id": None, "ok": False, "error": f"Invalid JSON request - {e}"})
+            continue
+
+        started = time.perf_counter()
+        response = handle_request(optimizer, request, out, profile_dir)
+        response["elapsedMs"] = round((time.perf_counter() - started) * 1000, 1)
+        write_frame(out, response)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve timetable optimization requests over stdin/stdout')
+    parser.add_argument('--locations', default='./venues.json', help='Locations file path')
+    parser.add_argument('--no-warmup', action='store_true', help='Skip the warm-up solve at startup')
+    parser.add_argument('--cache-db', default=os.environ.get('OPTIMIZER_CACHE_DB'),
+                        help='SQLite file for the persistent result cache tier (default: $OPTIMIZER_CACHE_DB)')
+    parser.add_argument('--profile-dir', default=os.environ.get('OPTIMIZER_PROFILE_DIR'),
+                        help='Write a cProfile dump of every request to this directory (default: $OPTIMIZER_PROFILE_DIR)')
+
+    args = parser.parse_args()
+    if args.profile_dir:
+        os.makedirs(args.profile_dir, exist_ok=True)
+
+    # Keep the protocol stream clean even if a library prints to stdout
+    protocol_out = sys.stdout.buffer
+    sys.stdout = sys.stderr
+
+    started = time.perf_counter()
+    optimizer = TimetableOptimizer(args.locations, ResultCache(db_path=args.cache_db))
+    # OR-Tools is imported lazily; a long-lived worker pays for it up front
+    cp_model.CpSolver
+    if not args.no_warmup:
+        optimizer.optimize_timetable(WARMUP_MODULES, WARMUP_CONSTRAINTS)
+
+    startup_ms = round((time.perf_counter() - started) * 1000, 1)
+    print(f"Worker {os.getpid()} ready in {startup_ms}ms", file=sys.stderr)
+    write_frame(protocol_out, {"type": "ready", "pid": os.getpid(), "startupMs": startup_ms})
+
+    try:
+        serve(optimizer, sys.stdin.buffer, protocol_out, args.profile_dir)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import cProfile
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+
+class PhaseTimer:
+    """
+    Lap timer charging wall-clock and CPU seconds to named phases.
+
+    Each lap(name) charges everything since the previous lap (or since the timer
+    was created) to name, so instrumenting a function is one call per phase
+    boundary. CPU time is process-wide, so it includes every solver thread.
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, Dict[str, float]] = {}
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+
+    def lap(self, name: str):
+        wall, cpu = time.perf_counter(), time.process_time()
+        entry = self.phases.setdefault(name, {"wallSeconds": 0.0, "cpuSeconds": 0.0})
+        entry["wallSeconds"] += wall - self._wall
+        entry["cpuSeconds"] += cpu - self._cpu
+        self._wall, self._cpu = wall, cpu
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {name: {key: round(value, 4) for key, value in entry.items()}
+                for name, entry in self.phases.items()}
+
+
+@contextmanager
+def profiled(path: Optional[str]) -> Iterator[None]:
+    """
+    Profile the enclosed block into path. A .html path gets a pyinstrument report
+    when pyinstrument is installed; anything else gets cProfile stats for pstats
+    or snakeviz. With no path this does nothing.
+    """
+    if not path:
+        yield
+        return
+
+    if path.endswith('.html'):
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            path = os.path.splitext(path)[0] + '.prof'
+            print(f"pyinstrument is not installed, writing cProfile stats to {path}", file=sys.stderr)
+        else:
+            profiler = Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                with open(path, 'w') as f:
+                    f.write(profiler.output_html())
+                print(f"Profile written to {path}", file=sys.stderr)
+            return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"Profile written to {path}", file=sys.stderr)
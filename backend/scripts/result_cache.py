@@ -0,0 +1,200 @@
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+# Solver options that only bound how long a solve may take or where it
+# starts searching. Only OPTIMAL results are cached, so they never change a
+# cached answer.
+VOLATILE_SOLVER_OPTIONS = {"deadlineMs", "timeLimitSeconds", "numSearchWorkers", "previous",
+                           "heuristic", "heuristicSeconds"}
+
+
+def _canonical_constraints(constraints: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop time slots explicitly marked available, which is the same as leaving them out"""
+    canonical = dict(constraints)
+    slots = constraints.get("preferredTimeSlots")
+    if isinstance(slots, dict):
+        canonical["preferredTimeSlots"] = {
+            day: {slot: False for slot, available in day_slots.items() if not available}
+            for day, day_slots in slots.items()
+            if isinstance(day_slots, dict) and not all(day_slots.values())
+        }
+    return canonical
+
+
+def _canonical_modules(modules: Dict[str, Any]) -> Dict[str, Any]:
+    """Ignore lesson order within a module, which does not change the problem"""
+    canonical = {}
+    for module_code, data in modules.items():
+        timetable = data.get("timetable") if isinstance(data, dict) else None
+        if not timetable:
+            canonical[module_code] = []
+            continue
+        canonical[module_code] = sorted(json.dumps(lesson, sort_keys=True) for lesson in timetable)
+    return canonical
+
+
+def module_fingerprint(data: Dict[str, Any]) -> str:
+    """Content hash of one module's timetable, used to tell whether it changed between requests"""
+    encoded = json.dumps(_canonical_modules({"": data})[""], separators=(',', ':')).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def request_key(modules: Dict[str, Any], constraints: Dict[str, Any], venues_version: str,
+                solver_options: Optional[Dict[str, Any]] = None, model_version: str = "") -> str:
+    """Content hash identifying an optimization problem, independent of key and lesson order"""
+    solver_options = {k: v for k, v in (solver_options or {}).items() if k not in VOLATILE_SOLVER_OPTIONS}
+    payload = {
+        "modules": _canonical_modules(modules),
+        "constraints": _canonical_constraints(constraints),
+        "venues": venues_version,
+        "solver": solver_options,
+        "model": model_version,
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class ResultCache:
+    """
+    LRU cache of optimization results with size and TTL eviction.
+
+    Entries live in memory; when db_path is set they are also written to a
+    SQLite file so they survive restarts and can be shared between processes.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 32 * 1024 * 1024,
+                 ttl_seconds: float = 24 * 3600, db_path: Optional[str] = None,
+                 max_disk_entries: int = 10000):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (stored_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._db = None
+        self.counters = {"hits": 0, "misses": 0, "memoryHits": 0, "diskHits": 0, "evictions": 0, "stores": 0}
+
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path: str):
+        try:
+            directory = os.path.dirname(os.path.abspath(db_path))
+            os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"Result cache disk tier disabled, cannot open {db_path}: {e}", file=sys.stderr)
+            self._db = None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, _, value = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.counters["hits"] += 1
+                    self.counters["memoryHits"] += 1
+                    return copy.deepcopy(value)
+                self._remove(key)
+
+            value = self._get_from_disk(key, now)
+            if value is not None:
+                self._store_in_memory(key, value, now)
+                self.counters["hits"] += 1
+                self.counters["diskHits"] += 1
+                return copy.deepcopy(value)
+
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        now = time.time()
+        with self._lock:
+            encoded = self._store_in_memory(key, copy.deepcopy(value), now)
+            self.counters["stores"] += 1
+            if self._db is not None and encoded is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO results (key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+                        (key, encoded, now, now))
+                    self._db.execute("DELETE FROM results WHERE stored_at < ?", (now - self.ttl_seconds,))
+                    self._db.execute(
+                        "DELETE FROM results WHERE key IN "
+                        "(SELECT key FROM results ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                        (self.max_disk_entries,))
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"Error writing result cache entry: {e}", file=sys.stderr)
+
+    def _store_in_memory(self, key: str, value: Dict[str, Any], now: float) -> Optional[str]:
+        try:
+            encoded = json.dumps(value, separators=(',', ':'))
+        except (TypeError, ValueError) as e:
+            print(f"Result is not cacheable: {e}", file=sys.stderr)
+            return None
+
+        size = len(encoded)
+        if size > self.max_bytes:
+            return encoded
+
+        self._remove(key)
+        self._entries[key] = (now, size, value)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.counters["evictions"] += 1
+        return encoded
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _get_from_disk(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT value, stored_at FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_seconds:
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            return json.loads(row[0])
+        except (sqlite3.Error, json.JSONDecodeError) as e:
+            print(f"Error reading result cache entry: {e}", file=sys.stderr)
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "hitRate": self.counters["hits"] / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "diskTier": self._db is not None,
+            }
@@ -0,0 +1,381 @@
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+from collections import Counter
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+
+from profiling import PhaseTimer
+
+EARTH_RADIUS_M = 6371000
+CLUSTER_LINK_RADIUS_M = 20  # Venues this close are chained into one cluster, roughly one building
+
+# Compiled venue asset: this header, then latitudes and longitudes (float64),
+# each venue's cluster (int32), the cluster distance matrix (float32), and the
+# venue codes as newline-separated UTF-8. Fields: magic, format version, venue
+# count, cluster count, venue code bytes, link radius and the source version.
+ASSET_HEADER = struct.Struct('<4sIIIII16s')
+ASSET_MAGIC = b'NUSV'
+ASSET_FORMAT = 1
+
+
+def _extract_coordinates(venue_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Return the coordinate dict of a venue entry, whichever key it is stored under"""
+    if 'location' in venue_data:
+        return venue_data['location']
+    if 'coordinates' in venue_data:
+        return venue_data['coordinates']
+    if 'x' in venue_data and 'y' in venue_data:
+        return {'x': venue_data['x'], 'y': venue_data['y']}
+    return None
+
+
+def building_prefix(venue: str) -> str:
+    """The building part of a venue code, e.g. COM1 for COM1-0208"""
+    return venue.split('-')[0]
+
+
+def haversine(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """Distances in metres between every coordinate of the first set and every one of the second"""
+    lat1, lon1, lat2, lon2 = (np.radians(a) for a in (lat1, lon1, lat2, lon2))
+
+    dlat = lat1[:, None] - lat2[None, :]
+    dlon = lon1[:, None] - lon2[None, :]
+
+    a = (np.sin(dlat / 2) ** 2 +
+         np.cos(lat1)[:, None] * np.cos(lat2)[None, :] * np.sin(dlon / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_matrix(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Pairwise haversine distances in metres between all coordinates"""
+    return haversine(lat, lon, lat, lon)
+
+
+def cluster_venues(lat: np.ndarray, lon: np.ndarray, radius: float = CLUSTER_LINK_RADIUS_M) -> np.ndarray:
+    """
+    Label coordinates with single-linkage clusters: two venues share a cluster when
+    a chain of venues at most radius metres apart joins them. Candidate neighbours
+    come from a grid of radius-sized cells, so only the 3x3 cells around each
+    venue are compared. Venues without coordinates get -1.
+    """
+    labels = np.full(len(lat), -1, dtype=np.int32)
+    placed = np.nonzero(~(np.isnan(lat) | np.isnan(lon)))[0]
+    if not len(placed):
+        return labels
+
+    # Equirectangular metres are accurate enough at campus scale to bucket venues
+    y = np.radians(lat) * EARTH_RADIUS_M
+    x = np.radians(lon) * EARTH_RADIUS_M * np.cos(np.radians(np.mean(lat[placed])))
+    cells: Dict[tuple, List[int]] = {}
+    for i in placed:
+        cells.setdefault((int(x[i] // radius), int(y[i] // radius)), []).append(int(i))
+
+    root = list(range(len(lat)))
+
+    def find(i):
+        while root[i] != i:
+            root[i] = root[root[i]]
+            i = root[i]
+        return i
+
+    for (cx, cy), members in cells.items():
+        nearby = [j for dx in (-1, 0, 1) for dy in (-1, 0, 1) for j in cells.get((cx + dx, cy + dy), [])]
+        close = haversine(lat[members], lon[members], lat[nearby], lon[nearby]) <= radius
+        for a, b in zip(*np.nonzero(close)):
+            root[find(members[a])] = find(nearby[b])
+
+    ids: Dict[int, int] = {}
+    for i in placed:
+        labels[i] = ids.setdefault(find(int(i)), len(ids))
+    return labels
+
+
+class VenueDistanceMatrix:
+    """
+    Venue index grouping the venues in venues.json into building clusters (see
+    cluster_venues), plus a float32 distance matrix between cluster centres.
+    Travel within a cluster is free, so only lessons in different clusters need
+    a travel term.
+
+    Venue codes missing from venues.json, or listed without coordinates, are
+    placed in the cluster most venues with the same building prefix belong to.
+    Empty venues and codes that cannot be placed have no travel.
+
+    A compiled asset (see write_asset; venues.bin next to venues.json by
+    default) is loaded with a single read when it was built from the current
+    venues file contents, skipping the JSON parse and clustering entirely;
+    latitudes and longitudes then come from the asset, and locations is only
+    parsed when first used. Otherwise clusters and the matrix are cached on disk
+    keyed by a hash of the venues file contents, so only the first process after
+    a venues update computes them.
+    """
+
+    def __init__(self, locations_file: str = './venues.json', cache_dir: Optional[str] = None,
+                 timer: Optional[PhaseTimer] = None, asset_file: Optional[str] = None):
+        timer = timer or PhaseTimer()
+        self.locations_file = locations_file
+        self._locations: Optional[Dict[str, Any]] = None
+        self.venues: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.version = 'empty'
+        self.latitudes = np.zeros(0)
+        self.longitudes = np.zeros(0)
+        self.venue_cluster = np.zeros(0, dtype=np.int32)
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.prefix_clusters: Dict[str, int] = {}
+        self._resolved: Dict[str, int] = {}
+
+        if cache_dir is None:
+            cache_dir = os.environ.get('VENUE_CACHE_DIR') or os.path.join(
+                os.path.dirname(os.path.abspath(locations_file)), '.cache')
+        self.cache_dir = cache_dir
+
+        if asset_file is None:
+            asset_file = os.path.splitext(locations_file)[0] + '.bin'
+        if self._load_asset(asset_file, locations_file):
+            timer.lap("venueLoad")
+            self._index_prefixes()
+            timer.lap("distancePrecompute")
+            return
+
+        try:
+            with open(locations_file, 'rb') as f:
+                raw = f.read()
+            self._locations = json.loads(raw)
+            self.version = hashlib.sha256(raw).hexdigest()[:16]
+            print(f"Loaded {len(self._locations)} venue locations from {locations_file}", file=sys.stderr)
+        except FileNotFoundError:
+            print(f"Warning: {locations_file} not found. Using default locations.", file=sys.stderr)
+            self._locations = {}
+            return
+        except Exception as e:
+            print(f"Error loading venues file: {e}", file=sys.stderr)
+            self._locations = {}
+            return
+        finally:
+            timer.lap("venueLoad")
+
+        self.venues = list(self._locations.keys())
+        self.index = {venue: i for i, venue in enumerate(self.venues)}
+        self.latitudes, self.longitudes = self._coordinates()
+        self.venue_cluster, self.matrix = self._load_or_build()
+        self._index_prefixes()
+        timer.lap("distancePrecompute")
+
+    @property
+    def locations(self) -> Dict[str, Any]:
+        """
+        The venues file contents. After an asset load they are parsed on first
+        use, or rebuilt from the asset's coordinates when the file is gone.
+        """
+        if self._locations is None:
+            try:
+                with open(self.locations_file, 'rb') as f:
+                    self._locations = json.loads(f.read())
+            except (OSError, ValueError) as e:
+                print(f"Rebuilding venue locations from coordinates: {e}", file=sys.stderr)
+                self._locations = {
+                    venue: {'location': {'x': float(lon), 'y': float(lat)}}
+                    for venue, lat, lon in zip(self.venues, self.latitudes, self.longitudes)
+                    if not (np.isnan(lat) or np.isnan(lon))
+                }
+        return self._locations
+
+    def _index_prefixes(self):
+        """Map each building prefix to the cluster most of its placed venues are in"""
+        by_prefix: Dict[str, Counter] = {}
+        for venue, cluster in zip(self.venues, self.venue_cluster.tolist()):
+            if cluster >= 0:
+                by_prefix.setdefault(building_prefix(venue), Counter())[cluster] += 1
+        self.prefix_clusters = {prefix: counts.most_common(1)[0][0] for prefix, counts in by_prefix.items()}
+
+    def _load_asset(self, asset_file: str, locations_file: str) -> bool:
+        """
+        Load a compiled asset unless it is missing, unreadable, or stale: built
+        from other venues file contents than locations_file has now. Hashing the
+        raw file is cheap next to parsing it; without a venues file the asset is
+        trusted as it is.
+        """
+        if not os.path.exists(asset_file):
+            return False
+        try:
+            with open(locations_file, 'rb') as f:
+                current = hashlib.sha256(f.read()).hexdigest()[:16]
+        except OSError:
+            current = None
+
+        try:
+            with open(asset_file, 'rb') as f:
+                data = f.read()
+            magic, version, count, clusters, names_size, radius, source = ASSET_HEADER.unpack_from(data)
+            if magic != ASSET_MAGIC or version != ASSET_FORMAT or radius != CLUSTER_LINK_RADIUS_M:
+                print(f"Ignoring {asset_file}: built for another format or link radius", file=sys.stderr)
+                return False
+            if current is not None and source.decode('ascii') != current:
+                print(f"Ignoring {asset_file}: built from an older {locations_file}", file=sys.stderr)
+                return False
+
+            offset = ASSET_HEADER.size
+            latitudes = np.frombuffer(data, dtype='<f8', count=count, offset=offset)
+            longitudes = np.frombuffer(data, dtype='<f8', count=count, offset=offset + 8 * count)
+            offset += 16 * count
+            venue_cluster = np.frombuffer(data, dtype='<i4', count=count, offset=offset)
+            offset += 4 * count
+            matrix = np.frombuffer(data, dtype='<f4', count=clusters * clusters, offset=offset).reshape(clusters, clusters)
+            offset += 4 * clusters * clusters
+            venues = data[offset:offset + names_size].decode('utf-8').split('\n') if count else []
+            if len(venues) != count:
+                raise ValueError(f"{len(venues)} venue codes for {count} venues")
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Ignoring unreadable venue asset {asset_file}: {e}", file=sys.stderr)
+            return False
+
+        self.venues = venues
+        self.index = {venue: i for i, venue in enumerate(self.venues)}
+        self.version = source.decode('ascii')
+        self.latitudes, self.longitudes = latitudes, longitudes
+        self.venue_cluster, self.matrix = venue_cluster, matrix
+        print(f"Loaded {count} venues in {clusters} clusters from {asset_file}", file=sys.stderr)
+        return True
+
+    def write_asset(self, path: str):
+        """Compile the venues, their coordinates and clusters into a binary asset at path"""
+        names = '\n'.join(self.venues).encode('utf-8')
+        clusters = len(self.matrix)
+        header = ASSET_HEADER.pack(ASSET_MAGIC, ASSET_FORMAT, len(self.venues), clusters, len(names),
+                                   CLUSTER_LINK_RADIUS_M, self.version.encode('ascii').ljust(16)[:16])
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            f.write(self.latitudes.astype('<f8').tobytes())
+            f.write(self.longitudes.astype('<f8').tobytes())
+            f.write(self.venue_cluster.astype('<i4').tobytes())
+            f.write(self.matrix.astype('<f4').tobytes())
+            f.write(names)
+        os.replace(tmp_path, path)
+
+    @property
+    def cache_path(self) -> str:
+        return os.path.join(self.cache_dir, f"venue_clusters_{self.version}_{CLUSTER_LINK_RADIUS_M}.npz")
+
+    def _load_or_build(self):
+        if not self.venues:
+            print("No venue data available, skipping distance computation", file=sys.stderr)
+            return np.zeros(0, dtype=np.int32), np.zeros((0, 0), dtype=np.float32)
+
+        path = self.cache_path
+        try:
+            with np.load(path) as cached:
+                venue_cluster, matrix = cached['venue_cluster'], cached['matrix']
+            clusters = int(venue_cluster.max()) + 1 if len(venue_cluster) else 0
+            if venue_cluster.shape == (len(self.venues),) and matrix.shape == (clusters, clusters):
+                print(f"Loaded {clusters} venue clusters from {path}", file=sys.stderr)
+                return venue_cluster, matrix
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Ignoring unreadable distance cache {path}: {e}", file=sys.stderr)
+
+        print(f"Clustering {len(self.venues)} venues...", file=sys.stderr)
+        venue_cluster, matrix = self._compute()
+        self._save(venue_cluster, matrix, path)
+        print(f"Distance matrix computed for {len(matrix)} clusters", file=sys.stderr)
+        return venue_cluster, matrix
+
+    def _coordinates(self):
+        """Latitude and longitude arrays of the venues in locations, NaN where a venue has no coordinates"""
+        count = len(self.venues)
+        lat = np.full(count, np.nan)
+        lon = np.full(count, np.nan)
+
+        for i, venue in enumerate(self.venues):
+            venue_data = self._locations[venue]
+            loc = _extract_coordinates(venue_data) if isinstance(venue_data, dict) else None
+            if not loc:
+                continue
+            try:
+                lon[i] = float(loc.get('x', 0))
+                lat[i] = float(loc.get('y', 0))
+            except (TypeError, ValueError, AttributeError) as e:
+                print(f"Error extracting coordinates for {venue}: {e}", file=sys.stderr)
+        return lat, lon
+
+    def _compute(self):
+        lat, lon = self.latitudes, self.longitudes
+        venue_cluster = cluster_venues(lat, lon)
+        clusters = int(venue_cluster.max()) + 1
+        placed = venue_cluster >= 0
+        sizes = np.bincount(venue_cluster[placed], minlength=clusters)
+        centre_lat = np.bincount(venue_cluster[placed], weights=lat[placed], minlength=clusters) / sizes
+        centre_lon = np.bincount(venue_cluster[placed], weights=lon[placed], minlength=clusters) / sizes
+
+        matrix = haversine_matrix(centre_lat, centre_lon)
+        np.fill_diagonal(matrix, 0)
+        return venue_cluster, matrix.astype(np.float32)
+
+    def _save(self, venue_cluster: np.ndarray, matrix: np.ndarray, path: str):
+        """Write the cache atomically so concurrent processes never see a partial file"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, venue_cluster=venue_cluster, matrix=matrix)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not write distance cache {path}: {e}", file=sys.stderr)
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def cluster_of(self, venue: str) -> int:
+        """Cluster of a venue code, resolving unknown codes by building prefix; -1 if it cannot be placed"""
+        cluster = self._resolved.get(venue)
+        if cluster is None:
+            i = self.index.get(venue)
+            cluster = int(self.venue_cluster[i]) if i is not None else -1
+            if cluster < 0 and venue:
+                cluster = self.prefix_clusters.get(building_prefix(venue), -1)
+            self._resolved[venue] = cluster
+        return cluster
+
+    def cluster_distance(self, cluster1: int, cluster2: int) -> float:
+        """Distance in metres between two cluster centres"""
+        return float(self.matrix[cluster1, cluster2])
+
+    def distance(self, venue1: str, venue2: str) -> Optional[float]:
+        """
+        Distance in metres between the clusters of two venue codes: 0 within one
+        cluster, None when either venue cannot be placed.
+        """
+        cluster1, cluster2 = self.cluster_of(venue1), self.cluster_of(venue2)
+        if cluster1 < 0 or cluster2 < 0:
+            return None
+        return self.cluster_distance(cluster1, cluster2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile venues.json into the binary venue asset')
+    parser.add_argument('locations', nargs='?', default='./venues.json', help='Locations file path')
+    parser.add_argument('-o', '--output', help='Asset path (default: the locations path with a .bin extension)')
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.locations)[0] + '.bin'
+    # An empty asset path forces the venues file to be read and clustered
+    venue_distances = VenueDistanceMatrix(args.locations, asset_file='')
+    if not venue_distances.venues:
+        print(f"Error: no venues loaded from {args.locations}", file=sys.stderr)
+        sys.exit(1)
+    venue_distances.write_asset(output)
+    print(f"Wrote {len(venue_distances.venues)} venues in {len(venue_distances.matrix)} clusters to {output}",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
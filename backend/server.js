@@ -27,10 +27,17 @@ app.use(cors({
 app.use(express.json({ limit: '10mb' }));
 
 let optimizeRoutes;
+let optimizerPoolService = null;
+let optimizerSchedulerService = null;
 try {
   optimizeRoutes = require('./routes/optimize');
   app.use('/api', optimizeRoutes);
   console.log('Optimization routes loaded successfully');
+
+  // Start the optimizer workers now so the first request finds them warm
+  optimizerPoolService = require('./services/optimizerPool');
+  optimizerPoolService.getOptimizerPool();
+  optimizerSchedulerService = require('./services/optimizerScheduler');
 } catch (error) {
   console.log('Warning: Optimization routes not found. Create ./routes/optimize.js');
   
@@ -50,7 +57,9 @@ app.get('/health', (req, res) => {
     status: 'Server running', 
     timestamp: new Date().toISOString(),
     port: PORT,
-    environment: process.env.NODE_ENV || 'development'
+    environment: process.env.NODE_ENV || 'development',
+    // Queue depth, wait times and core usage of optimization jobs
+    ...(optimizerSchedulerService && { optimizer: optimizerSchedulerService.getOptimizerScheduler().status() })
   });
 });
 
@@ -83,6 +92,7 @@ server.on('error', (err) => {
 
 process.on('SIGTERM', () => {
   console.log('SIGTERM received, shutting down gracefully');
+  if (optimizerPoolService) optimizerPoolService.shutdownOptimizerPool();
   server.close(() => {
     console.log('Server closed');
     process.exit(0);
@@ -91,6 +101,7 @@ process.on('SIGTERM', () => {
 
 process.on('SIGINT', () => {
   console.log('\nSIGINT received, shutting down gracefully');
+  if (optimizerPoolService) optimizerPoolService.shutdownOptimizerPool();
   server.close(() => {
     console.log('Server closed');
     process.exit(0);
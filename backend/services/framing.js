@@ -0,0 +1,79 @@
+// Length-prefixed JSON framing shared with scripts/framing.py.
+//
+// Every message is a 4-byte big-endian payload length followed by that many
+// bytes of compact UTF-8 JSON, so a reader knows exactly where each message
+// ends without scanning for newlines.
+
+const HEADER_BYTES = 4;
+const MAX_FRAME_BYTES = 256 * 1024 * 1024;
+
+function encodeFrame(message) {
+  const payload = Buffer.from(JSON.stringify(message), 'utf8');
+  const header = Buffer.alloc(HEADER_BYTES);
+  header.writeUInt32BE(payload.length, 0);
+  return Buffer.concat([header, payload]);
+}
+
+// Reassembles frames from stream chunks. Each complete payload is parsed as
+// soon as its last byte arrives and handed to onMessage; payloads that are not
+// valid JSON, and impossible lengths, go to onError.
+class FrameDecoder {
+  constructor(onMessage, onError = () => {}) {
+    this.onMessage = onMessage;
+    this.onError = onError;
+    this.chunks = [];
+    this.buffered = 0;
+    this.expected = null;
+  }
+
+  push(chunk) {
+    this.chunks.push(chunk);
+    this.buffered += chunk.length;
+
+    for (;;) {
+      if (this.expected === null) {
+        if (this.buffered < HEADER_BYTES) return;
+        this.expected = this.take(HEADER_BYTES).readUInt32BE(0);
+        if (this.expected > MAX_FRAME_BYTES) {
+          this.onError(new Error(`Frame of ${this.expected} bytes exceeds the ${MAX_FRAME_BYTES} byte limit`));
+          this.reset();
+          return;
+        }
+      }
+      if (this.buffered < this.expected) return;
+
+      const payload = this.take(this.expected);
+      this.expected = null;
+      let message;
+      try {
+        message = JSON.parse(payload.toString('utf8'));
+      } catch (error) {
+        this.onError(error, payload);
+        continue;
+      }
+      this.onMessage(message);
+    }
+  }
+
+  // Bytes left over from a frame that never completed
+  get pending() {
+    return this.buffered + (this.expected === null ? 0 : HEADER_BYTES);
+  }
+
+  take(size) {
+    const all = this.chunks.length === 1 ? this.chunks[0] : Buffer.concat(this.chunks);
+    const taken = all.subarray(0, size);
+    const rest = all.subarray(size);
+    this.chunks = rest.length ? [rest] : [];
+    this.buffered = rest.length;
+    return taken;
+  }
+
+  reset() {
+    this.chunks = [];
+    this.buffered = 0;
+    this.expected = null;
+  }
+}
+
+module.exports = { encodeFrame, FrameDecoder };
@@ -0,0 +1,235 @@
+const { spawn } = require('child_process');
+const path = require('path');
+const { encodeFrame, FrameDecoder } = require('./framing');
+const { resultFromIncumbent } = require('./optimizerResults');
+
+const scriptsDir = path.join(__dirname, '../scripts');
+const workerScriptPath = path.join(scriptsDir, 'optimizer_worker.py');
+const venuesPath = path.join(scriptsDir, 'venues.json');
+const defaultCacheDb = path.join(scriptsDir, '.cache', 'results.sqlite');
+
+const RESPAWN_DELAY_MS = 1000;
+
+// Environment for optimizer processes. They share one SQLite result cache
+// unless OPTIMIZER_CACHE_DB points elsewhere (or is set to '' to disable it).
+function optimizerEnv() {
+  return {
+    ...process.env,
+    PYTHONUNBUFFERED: '1',
+    OPTIMIZER_CACHE_DB: process.env.OPTIMIZER_CACHE_DB ?? defaultCacheDb
+  };
+}
+
+class OptimizerPoolError extends Error {
+  constructor(message, details = '') {
+    super(message);
+    this.name = 'OptimizerPoolError';
+    this.details = details;
+  }
+}
+
+// Pool of long-lived optimizer_worker.py processes. Each worker pays the
+// interpreter, OR-Tools and venue start-up cost once and then serves one
+// request at a time over length-prefixed JSON frames on stdin/stdout (see
+// framing.js). Improving
+// solutions streamed by a worker are kept, so a job that hits its timeout
+// resolves with the best incumbent instead of failing.
+class OptimizerPool {
+  constructor({ size = 2, timeoutMs = 90000, pythonPath = 'python3' } = {}) {
+    this.size = size;
+    this.timeoutMs = timeoutMs;
+    this.pythonPath = pythonPath;
+    this.workers = [];
+    this.queue = [];
+    this.nextRequestId = 1;
+    this.closed = false;
+    this.stats = { completed: 0, failed: 0, timedOut: 0, restarts: 0 };
+  }
+
+  start() {
+    for (let i = 0; i < this.size; i++) {
+      this.workers.push(this.spawnWorker(i));
+    }
+    return this;
+  }
+
+  spawnWorker(slot) {
+    const proc = spawn(this.pythonPath, [workerScriptPath, '--locations', venuesPath], {
+      stdio: ['pipe', 'pipe', 'pipe'],
+      cwd: scriptsDir,
+      env: optimizerEnv()
+    });
+
+    const worker = { slot, proc, ready: false, job: null, timedOut: false, stderrTail: [], cache: null };
+
+    const decoder = new FrameDecoder(
+      message => this.handleMessage(worker, message),
+      (error, payload) => console.error(`Optimizer worker ${slot} sent an invalid frame:`, error.message,
+        payload ? payload.toString('utf8', 0, 200) : '')
+    );
+    proc.stdout.on('data', chunk => decoder.push(chunk));
+
+    proc.stderr.on('data', (data) => {
+      const lines = data.toString().split('\n').filter(Boolean);
+      worker.stderrTail = worker.stderrTail.concat(lines).slice(-20);
+      lines.forEach(line => console.log(`Optimizer worker ${slot}:`, line));
+    });
+
+    proc.on('error', (error) => {
+      console.error(`Optimizer worker ${slot} failed to start:`, error.message);
+    });
+
+    proc.on('exit', (code, signal) => {
+      worker.ready = false;
+      if (worker.job) {
+        const message = worker.timedOut
+          ? 'Optimization timed out'
+          : `Optimizer worker exited (code ${code}, signal ${signal})`;
+        this.finishJob(worker, new OptimizerPoolError(message, worker.stderrTail.join('\n')));
+      }
+      if (this.closed) return;
+
+      console.log(`Optimizer worker ${slot} exited, restarting`);
+      this.stats.restarts++;
+      setTimeout(() => {
+        if (!this.closed) this.workers[slot] = this.spawnWorker(slot);
+      }, RESPAWN_DELAY_MS);
+    });
+
+    return worker;
+  }
+
+  handleMessage(worker, message) {
+    if (message.type === 'ready') {
+      worker.ready = true;
+      console.log(`Optimizer worker ${worker.slot} ready (pid ${message.pid}, ${message.startupMs}ms)`);
+      this.dispatch();
+      return;
+    }
+
+    if (!worker.job || message.id !== worker.job.id) {
+      console.error(`Optimizer worker ${worker.slot} sent an unexpected response for id ${message.id}`);
+      return;
+    }
+
+    if (message.type === 'incumbent') {
+      worker.job.bestIncumbent = message;
+      return;
+    }
+
+    if (message.cache) {
+      worker.cache = message.cache;
+    }
+
+    if (message.ok) {
+      this.finishJob(worker, null, message.result);
+    } else {
+      this.finishJob(worker, new OptimizerPoolError('Optimization process failed', message.error));
+    }
+  }
+
+  finishJob(worker, error, result) {
+    const job = worker.job;
+    worker.job = null;
+    clearTimeout(job.timer);
+
+    if (error) {
+      this.stats.failed++;
+      job.reject(error);
+    } else {
+      this.stats.completed++;
+      job.resolve(result);
+    }
+    this.dispatch();
+  }
+
+  run(payload, { timeoutMs = this.timeoutMs } = {}) {
+    if (this.closed) {
+      return Promise.reject(new OptimizerPoolError('Optimizer pool is shut down'));
+    }
+    return new Promise((resolve, reject) => {
+      const job = { id: this.nextRequestId++, payload, timeoutMs, enqueuedAt: Date.now(), resolve, reject };
+      job.timer = setTimeout(() => {
+        this.queue = this.queue.filter(queued => queued !== job);
+        this.stats.timedOut++;
+        reject(new OptimizerPoolError('Optimization timed out waiting for a free worker'));
+      }, timeoutMs);
+
+      this.queue.push(job);
+      this.dispatch();
+    });
+  }
+
+  dispatch() {
+    for (const worker of this.workers) {
+      if (!this.queue.length) return;
+      if (!worker.ready || worker.job) continue;
+
+      const job = this.queue.shift();
+      worker.job = job;
+      clearTimeout(job.timer);
+      const remainingMs = Math.max(job.timeoutMs - (Date.now() - job.enqueuedAt), 1);
+      job.timer = setTimeout(() => {
+        console.log(`Optimization timeout on worker ${worker.slot}, restarting it`);
+        this.stats.timedOut++;
+        worker.timedOut = true;
+        worker.ready = false;
+        worker.proc.kill('SIGTERM');
+        if (job.bestIncumbent) {
+          this.finishJob(worker, null, resultFromIncumbent(job.payload.modules, job.bestIncumbent));
+        }
+      }, remainingMs);
+
+      worker.proc.stdin.write(encodeFrame({ id: job.id, ...job.payload }));
+    }
+  }
+
+  cacheStatus() {
+    const cache = { hits: 0, misses: 0, memoryHits: 0, diskHits: 0, evictions: 0, entries: 0 };
+    this.workers.forEach(worker => {
+      if (!worker.cache) return;
+      Object.keys(cache).forEach(key => { cache[key] += worker.cache[key] || 0; });
+    });
+    const lookups = cache.hits + cache.misses;
+    cache.hitRate = lookups ? cache.hits / lookups : 0;
+    return cache;
+  }
+
+  status() {
+    return {
+      size: this.size,
+      ready: this.workers.filter(w => w.ready).length,
+      busy: this.workers.filter(w => w.job).length,
+      queued: this.queue.length,
+      ...this.stats,
+      cache: this.cacheStatus()
+    };
+  }
+
+  shutdown() {
+    this.closed = true;
+    this.queue.splice(0).forEach(job => job.reject(new OptimizerPoolError('Optimizer pool is shut down')));
+    this.workers.forEach(worker => worker.proc.kill('SIGTERM'));
+  }
+}
+
+let sharedPool = null;
+
+function getOptimizerPool() {
+  const size = parseInt(process.env.OPTIMIZER_POOL_SIZE || '2', 10);
+  if (!size || size < 1) return null;
+
+  if (!sharedPool) {
+    sharedPool = new OptimizerPool({ size }).start();
+  }
+  return sharedPool;
+}
+
+function shutdownOptimizerPool() {
+  if (sharedPool) {
+    sharedPool.shutdown();
+    sharedPool = null;
+  }
+}
+
+module.exports = { OptimizerPool, OptimizerPoolError, getOptimizerPool, shutdownOptimizerPool, optimizerEnv };
@@ -0,0 +1,34 @@
+// Helpers for turning optimizer output into timetable responses.
+
+// Keep only the lessons of the classes named in a compact
+// { moduleCode: { lessonType: classNo } } selection.
+function applySelection(modules, selection) {
+  const selected = {};
+  Object.entries(modules).forEach(([moduleCode, moduleData]) => {
+    const choice = selection[moduleCode];
+    if (!choice || !Array.isArray(moduleData.timetable)) {
+      selected[moduleCode] = moduleData;
+      return;
+    }
+    selected[moduleCode] = {
+      moduleCode,
+      timetable: moduleData.timetable.filter(lesson => choice[lesson.lessonType] === lesson.classNo)
+    };
+  });
+  return selected;
+}
+
+// Build a full result from the best incumbent streamed before a deadline hit.
+function resultFromIncumbent(modules, incumbent) {
+  return {
+    modules: applySelection(modules, incumbent.selection),
+    status: 'FEASIBLE',
+    timedOut: true,
+    objective: incumbent.objective,
+    bestBound: incumbent.bestBound,
+    gap: incumbent.gap,
+    wallTime: incumbent.wallTime
+  };
+}
+
+module.exports = { applySelection, resultFromIncumbent };
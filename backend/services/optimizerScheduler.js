@@ -0,0 +1,180 @@
+const os = require('os');
+const { getOptimizerPool } = require('./optimizerPool');
+
+const DEFAULT_QUEUE_LIMIT = 32;
+const DEFAULT_MAX_WORKERS_PER_JOB = 8;
+const WAIT_SAMPLES = 200;
+const MAX_RETRY_AFTER_SECONDS = 120;
+// Fraction of the core budget a single job may not take, so a job that
+// arrives while another runs can still start straight away
+const RESERVED_CORE_FRACTION = 0.25;
+
+class SchedulerRejection extends Error {
+  constructor(message, status, retryAfterSeconds = null) {
+    super(message);
+    this.name = 'SchedulerRejection';
+    this.status = status;
+    this.retryAfterSeconds = retryAfterSeconds;
+  }
+}
+
+function percentile(sorted, pct) {
+  if (!sorted.length) return 0;
+  return sorted[Math.min(sorted.length - 1, Math.ceil(pct / 100 * sorted.length) - 1)];
+}
+
+// Admission control for optimization jobs. Every CP-SAT search worker is a
+// busy thread, so jobs draw search workers from a fixed core budget instead of
+// each asking for four: a job starts only while cores are free, and takes its
+// share of them given how many jobs are still waiting. No job takes more than
+// maxJobCores, which keeps a reserved slice of the budget free for the next
+// arrival. Waiting jobs start earliest deadline first, and are rejected as soon
+// as their deadline passes. When the queue is full new jobs are rejected with a
+// retry hint rather than piling up behind work they would time out on.
+class OptimizerScheduler {
+  constructor({
+    coreBudget = os.cpus().length || 1,
+    maxRunning = Infinity,
+    queueLimit = DEFAULT_QUEUE_LIMIT,
+    maxWorkersPerJob = DEFAULT_MAX_WORKERS_PER_JOB
+  } = {}) {
+    this.coreBudget = Math.max(1, coreBudget);
+    this.maxRunning = Math.max(1, Math.min(maxRunning, this.coreBudget));
+    this.queueLimit = queueLimit;
+    this.maxWorkersPerJob = Math.max(1, maxWorkersPerJob);
+    const reserved = this.maxRunning > 1 ? Math.ceil(this.coreBudget * RESERVED_CORE_FRACTION) : 0;
+    this.maxJobCores = Math.max(1, this.coreBudget - reserved);
+    this.queue = [];
+    this.running = 0;
+    this.coresInUse = 0;
+    this.waitSamples = [];
+    this.meanRunMs = null;
+    this.stats = { admitted: 0, rejected: 0, expired: 0, completed: 0, failed: 0 };
+  }
+
+  // Run task(searchWorkers) once the job's turn comes. deadline is the epoch
+  // millisecond time the caller stops waiting; earlier deadlines go first.
+  schedule(deadline, task) {
+    if (this.queue.length >= this.queueLimit) {
+      this.stats.rejected++;
+      return Promise.reject(new SchedulerRejection(
+        'Optimizer is at capacity, try again shortly', 429, this.retryAfterSeconds()));
+    }
+
+    this.stats.admitted++;
+    return new Promise((resolve, reject) => {
+      const job = { deadline, task, resolve, reject, enqueuedAt: Date.now(), timer: null };
+      job.timer = setTimeout(() => this.expire(job), Math.max(0, deadline - job.enqueuedAt));
+      this.queue.push(job);
+      this.dispatch();
+    });
+  }
+
+  // Reject a job whose deadline passed before it could start
+  expire(job) {
+    const index = this.queue.indexOf(job);
+    if (index === -1) return;
+    this.queue.splice(index, 1);
+    this.recordWait(Date.now() - job.enqueuedAt);
+    this.stats.expired++;
+    job.reject(new SchedulerRejection('Optimization deadline passed while queued', 503, this.retryAfterSeconds()));
+  }
+
+  dispatch() {
+    while (this.queue.length && this.running < this.maxRunning && this.coresInUse < this.coreBudget) {
+      let next = 0;
+      this.queue.forEach((job, i) => {
+        if (job.deadline < this.queue[next].deadline) next = i;
+      });
+      const starting = Math.min(this.queue.length, this.maxRunning - this.running);
+      const job = this.queue[next];
+      const now = Date.now();
+      if (job.deadline <= now) {
+        this.expire(job);
+        continue;
+      }
+      this.queue.splice(next, 1);
+      clearTimeout(job.timer);
+      this.recordWait(now - job.enqueuedAt);
+
+      // Split the free cores evenly between the waiting jobs that can start now
+      const free = this.coreBudget - this.coresInUse;
+      const share = Math.min(this.maxWorkersPerJob, this.maxJobCores, Math.floor(free / starting));
+      const workers = Math.max(1, share);
+      this.running++;
+      this.coresInUse += workers;
+
+      Promise.resolve()
+        .then(() => job.task(workers))
+        .then(
+          result => { this.finish(workers, now, true); job.resolve(result); },
+          error => { this.finish(workers, now, false); job.reject(error); }
+        );
+    }
+  }
+
+  finish(workers, startedAt, succeeded) {
+    this.running--;
+    this.coresInUse -= workers;
+    this.stats[succeeded ? 'completed' : 'failed']++;
+    const runMs = Date.now() - startedAt;
+    this.meanRunMs = this.meanRunMs === null ? runMs : 0.8 * this.meanRunMs + 0.2 * runMs;
+    this.dispatch();
+  }
+
+  recordWait(waitMs) {
+    this.waitSamples.push(waitMs);
+    if (this.waitSamples.length > WAIT_SAMPLES) this.waitSamples.shift();
+  }
+
+  // Rough time until a new job would start: the queue drains maxRunning jobs
+  // per mean run time
+  retryAfterSeconds() {
+    const runMs = this.meanRunMs === null ? 1000 : this.meanRunMs;
+    const rounds = (this.queue.length + 1) / this.maxRunning;
+    return Math.min(MAX_RETRY_AFTER_SECONDS, Math.max(1, Math.ceil(rounds * runMs / 1000)));
+  }
+
+  status() {
+    const waits = [...this.waitSamples].sort((a, b) => a - b);
+    return {
+      coreBudget: this.coreBudget,
+      coresInUse: this.coresInUse,
+      maxJobCores: this.maxJobCores,
+      maxRunning: this.maxRunning,
+      running: this.running,
+      queueDepth: this.queue.length,
+      queueLimit: this.queueLimit,
+      waitMs: {
+        p50: percentile(waits, 50),
+        p95: percentile(waits, 95),
+        max: waits.length ? waits[waits.length - 1] : 0
+      },
+      meanRunMs: this.meanRunMs === null ? null : Math.round(this.meanRunMs),
+      ...this.stats
+    };
+  }
+}
+
+let sharedScheduler = null;
+
+function envInt(name, fallback) {
+  const value = parseInt(process.env[name] || '', 10);
+  return value > 0 ? value : fallback;
+}
+
+function getOptimizerScheduler() {
+  if (!sharedScheduler) {
+    // A pooled deployment can run no more jobs at once than it has workers
+    const pool = getOptimizerPool();
+    sharedScheduler = new OptimizerScheduler({
+      coreBudget: envInt('OPTIMIZER_CORE_BUDGET', os.cpus().length || 1),
+      maxRunning: pool ? pool.size : Infinity,
+      queueLimit: envInt('OPTIMIZER_QUEUE_LIMIT', DEFAULT_QUEUE_LIMIT),
+      maxWorkersPerJob: envInt('OPTIMIZER_MAX_WORKERS_PER_JOB', DEFAULT_MAX_WORKERS_PER_JOB)
+    });
+  }
+  return sharedScheduler;
+}
+
+module.exports = { OptimizerScheduler, SchedulerRejection, getOptimizerScheduler };
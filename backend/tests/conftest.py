@@ -0,0 +1,53 @@
+"""
+Shared test setup: import paths for scripts/ and benchmarks/, synthetic
+workloads, and optimizers whose venue cache, venue asset and result cache all
+live under pytest's temporary directories instead of scripts/.
+"""
+
+import os
+import shutil
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'scripts'))
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'benchmarks'))
+
+from optimized_timetable_optimizer import TimetableOptimizer  # noqa: E402
+from result_cache import ResultCache  # noqa: E402
+from workloads import VENUES_PATH, load_venue_buildings, synthetic_payload  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated_caches(monkeypatch):
+    """Keep the environment from pointing a test at a shared venue or result cache"""
+    monkeypatch.delenv('VENUE_CACHE_DIR', raising=False)
+    monkeypatch.delenv('OPTIMIZER_CACHE_DB', raising=False)
+
+
+@pytest.fixture(scope='session')
+def buildings():
+    return load_venue_buildings()
+
+
+@pytest.fixture(scope='session')
+def venues_file(tmp_path_factory):
+    """A copy of venues.json; its distance cache and asset are looked up next to it"""
+    path = tmp_path_factory.mktemp('venues') / 'venues.json'
+    shutil.copy(VENUES_PATH, path)
+    return str(path)
+
+
+@pytest.fixture
+def make_payload(buildings):
+    """synthetic_payload with the small, quickly solved shape most tests use"""
+    def make(seed=2, modules=4, pool=6, sessions=2, density=0.3):
+        return synthetic_payload(modules, pool, sessions, density, seed, buildings)
+    return make
+
+
+@pytest.fixture
+def make_optimizer(venues_file):
+    """A fresh optimizer with an in-memory result cache, so no result leaks between calls"""
+    return lambda: TimetableOptimizer(venues_file, ResultCache(db_path=None))
@@ -0,0 +1,19 @@
+"""Batches solve each distinct request once and count every other job as a cache hit."""
+
+import pytest
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_identical_jobs_are_solved_once(max_workers, make_payload, make_optimizer):
+    payloads = [make_payload(seed) for seed in (2, 5)]
+    # Jobs 0, 2 and 4 are the same request, as are 1, 3 and 5
+    jobs = [{"id": i, **payloads[i % 2], "solver": {"timeLimitSeconds": 20}} for i in range(6)]
+
+    batch = make_optimizer().optimize_batch(jobs, max_workers=max_workers)
+    results, stats = batch["results"], batch["stats"]
+
+    assert stats["solved"] == 2
+    assert stats["cacheHits"] == 4
+    assert sum(1 for result in results.values() if result.get("cached")) == stats["cacheHits"]
+    for i in range(2, 6):
+        assert results[i]["selection"] == results[i % 2]["selection"]
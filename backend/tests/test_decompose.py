@@ -0,0 +1,22 @@
+"""Independent parts split the search worker budget without exceeding it."""
+
+import pytest
+
+from optimized_timetable_optimizer import split_workers
+
+
+@pytest.mark.parametrize("total, sizes, expected", [
+    (2, [90, 10], [1, 1]),
+    (4, [90, 10], [3, 1]),
+    (8, [5, 3, 2], [4, 2, 2]),
+    (8, [100, 1, 1], [6, 1, 1]),
+    (1, [3], [1]),
+])
+def test_shares_add_up_to_the_budget(total, sizes, expected):
+    assert split_workers(total, sizes) == expected
+    assert sum(split_workers(total, sizes)) == total
+
+
+def test_more_parts_than_workers():
+    # One worker each; solve_parts runs only `total` of them at once
+    assert split_workers(3, [1, 1, 1, 1, 1]) == [1, 1, 1, 1, 1]
@@ -0,0 +1,21 @@
+"""
+The heuristic finds a clash-free timetable for feasible multi-module requests,
+so heuristic "only" requests rarely fall back to CP-SAT.
+"""
+
+import pytest
+
+
+@pytest.mark.parametrize("modules, pool", [(7, 20), (8, 30)])
+def test_heuristic_avoids_clashes(modules, pool, make_payload, make_optimizer):
+    optimizer = make_optimizer()
+    clash_free = 0
+    for seed in range(8):
+        payload = make_payload(seed, modules=modules, pool=pool)
+        result = optimizer.optimize(payload["modules"], payload["constraints"],
+                                    {"heuristic": "only", "heuristicSeconds": 0.2,
+                                     "timeLimitSeconds": 20, "numSearchWorkers": 1})
+        clash_free += result["heuristic"]["clashes"] == 0
+
+    # Every one of these requests has a clash-free timetable
+    assert clash_free == 8
@@ -0,0 +1,64 @@
+"""
+fixUnchanged re-solves keep most classes of the previous timetable fixed, so
+they may miss the best timetable for the new constraints. They must say so:
+never OPTIMAL and never a bound, and never better than a cold solve claims.
+"""
+
+import copy
+
+import pytest
+
+SOLVER = {"timeLimitSeconds": 20, "numSearchWorkers": 1}
+
+
+def block_chosen_slots(payload, result, count):
+    """Edits that each block the start slot of one lesson of the previous timetable"""
+    edits = []
+    for module in list(result["modules"].values())[:count]:
+        lesson = module["timetable"][0]
+        constraints = copy.deepcopy(payload["constraints"])
+        constraints["preferredTimeSlots"][lesson["day"]][lesson["startTime"]] = False
+        edits.append(constraints)
+    return edits
+
+
+@pytest.mark.parametrize("seed", [2, 5])
+def test_fix_unchanged_is_never_labelled_optimal(seed, make_payload, make_optimizer):
+    payload = make_payload(seed)
+    modules = payload["modules"]
+    first = make_optimizer().optimize(modules, payload["constraints"], dict(SOLVER))
+    assert first["status"] == "OPTIMAL"
+    previous = {"selection": first["selection"], "constraints": payload["constraints"]}
+
+    for constraints in block_chosen_slots(payload, first, 4):
+        cold = make_optimizer().optimize(modules, constraints, dict(SOLVER))
+        warm = make_optimizer().optimize(modules, constraints,
+                                          {**SOLVER, "previous": previous, "fixUnchanged": True})
+        assert cold["status"] == "OPTIMAL"
+        assert warm["incremental"]["fixedGroups"] > 0
+        assert warm["status"] == "FEASIBLE"
+        assert warm["bestBound"] is None and warm["gap"] is None
+        assert warm["objective"] <= cold["objective"] + 1e-6
+
+
+def test_remembered_solutions_only_hint(make_payload, make_optimizer):
+    payload = make_payload()
+    optimizer = make_optimizer()
+    first = optimizer.optimize(payload["modules"], payload["constraints"], dict(SOLVER))
+    constraints = block_chosen_slots(payload, first, 1)[0]
+
+    # Another user's request for the same modules must not be pinned to this timetable
+    result = optimizer.optimize(payload["modules"], constraints, {**SOLVER, "fixUnchanged": True})
+    assert result["incremental"]["hintedGroups"] > 0
+    assert result["incremental"]["fixedGroups"] == 0
+    assert result["status"] == "OPTIMAL"
+
+
+def test_malformed_previous_constraints(make_payload, make_optimizer):
+    payload = make_payload()
+    first = make_optimizer().optimize(payload["modules"], payload["constraints"], dict(SOLVER))
+    previous = {"selection": first["selection"], "constraints": "not an object"}
+
+    result = make_optimizer().optimize(payload["modules"], payload["constraints"],
+                                        {**SOLVER, "previous": previous, "fixUnchanged": True})
+    assert result["status"] in ("OPTIMAL", "FEASIBLE")
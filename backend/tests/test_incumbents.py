@@ -0,0 +1,17 @@
+"""Streamed incumbents only ever improve, so a caller can keep the latest one."""
+
+import pytest
+
+
+@pytest.mark.parametrize("seed", [1, 2, 5])
+def test_incumbents_strictly_improve(seed, make_payload, make_optimizer):
+    payload = make_payload(seed, modules=5, pool=10)
+    objectives = []
+    result = make_optimizer().optimize(
+        payload["modules"], payload["constraints"], {"timeLimitSeconds": 20, "numSearchWorkers": 1},
+        on_incumbent=lambda incumbent: objectives.append(incumbent["objective"]))
+
+    assert result["status"] == "OPTIMAL"
+    assert objectives, "the heuristic timetable is always streamed"
+    assert all(earlier < later for earlier, later in zip(objectives, objectives[1:]))
+    assert objectives[-1] <= result["objective"]
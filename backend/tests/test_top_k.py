@@ -0,0 +1,55 @@
+"""
+Further timetables may use classes presolve would drop as equivalent or
+dominated, and share the request's time limit with the first one.
+"""
+
+import time
+
+import pytest
+
+
+def tutorial(class_no, day="Tuesday", start="1000"):
+    return {"lessonType": "Tutorial", "classNo": class_no, "day": day, "startTime": start,
+            "endTime": f"{int(start[:2]) + 1:02d}00", "venue": "COM1-0208", "weeks": list(range(3, 14))}
+
+
+def equivalent_tutorials_payload():
+    lecture = {"lessonType": "Lecture", "classNo": "1", "day": "Monday", "startTime": "1000",
+               "endTime": "1200", "venue": "LT19", "weeks": list(range(1, 14))}
+    # Three tutorials at the same time in the same room: presolve keeps one of them
+    timetable = [lecture] + [tutorial(class_no) for class_no in ("01", "02", "03")]
+    return {"CS1010": {"moduleCode": "CS1010", "timetable": timetable}}, {"preferredTimeSlots": {}}
+
+
+@pytest.mark.parametrize("presolve", [True, False])
+def test_top_k_keeps_equivalent_classes(presolve, make_optimizer):
+    modules, constraints = equivalent_tutorials_payload()
+    result = make_optimizer().optimize(modules, constraints, {"timeLimitSeconds": 20, "numSearchWorkers": 1,
+                                                              "topK": 3, "presolve": presolve})
+
+    assert result["status"] == "OPTIMAL"
+    tutorials = [timetable["selection"]["CS1010"]["Tutorial"] for timetable in result["timetables"]]
+    assert sorted(tutorials) == ["01", "02", "03"]
+
+
+def test_top_k_keeps_dominated_classes(make_optimizer):
+    modules, _ = equivalent_tutorials_payload()
+    # A tutorial in an unwanted slot is dominated by the 10am ones, but still a valid fourth timetable
+    modules["CS1010"]["timetable"].append(tutorial("04", "Friday", "1800"))
+    constraints = {"preferredTimeSlots": {"Friday": {"1800": False}}}
+    result = make_optimizer().optimize(modules, constraints, {"timeLimitSeconds": 20, "numSearchWorkers": 1,
+                                                              "topK": 4})
+
+    assert len(result["timetables"]) == 4
+    assert result["timetables"][-1]["selection"]["CS1010"]["Tutorial"] == "04"
+
+
+def test_top_k_stays_within_the_time_limit(make_payload, make_optimizer):
+    # Large enough that neither the first solve nor the re-solves finish early
+    payload = make_payload(0, modules=8, pool=30)
+    started = time.time()
+    result = make_optimizer().optimize(payload["modules"], payload["constraints"],
+                                       {"timeLimitSeconds": 2, "numSearchWorkers": 1, "topK": 4})
+
+    assert result["status"] in ("OPTIMAL", "FEASIBLE")
+    assert time.time() - started < 2.5
@@ -0,0 +1,68 @@
+"""The compiled venue asset is only used when it matches the venues file contents."""
+
+import json
+import os
+import shutil
+
+import numpy as np
+
+from venue_distances import VenueDistanceMatrix
+from workloads import VENUES_PATH
+
+
+def build(tmp_path):
+    locations = str(tmp_path / 'venues.json')
+    shutil.copy(VENUES_PATH, locations)
+    built = VenueDistanceMatrix(locations, cache_dir=str(tmp_path / 'cache'), asset_file='')
+    built.write_asset(str(tmp_path / 'venues.bin'))
+    return locations, built
+
+
+def test_asset_matches_the_json_path(tmp_path):
+    locations, built = build(tmp_path)
+    loaded = VenueDistanceMatrix(locations, cache_dir=str(tmp_path / 'fresh-cache'))
+
+    assert not os.path.exists(tmp_path / 'fresh-cache')  # Loaded from the asset, nothing was clustered
+    assert loaded.version == built.version
+    assert loaded.venues == built.venues
+    assert np.array_equal(loaded.latitudes, built.latitudes, equal_nan=True)
+    assert np.array_equal(loaded.longitudes, built.longitudes, equal_nan=True)
+    assert np.array_equal(loaded.venue_cluster, built.venue_cluster)
+    assert np.array_equal(loaded.matrix, built.matrix)
+    assert loaded.prefix_clusters == built.prefix_clusters
+    assert loaded.locations == built.locations
+
+
+def test_asset_loaded_matrix_writes_the_same_asset(tmp_path):
+    locations, _ = build(tmp_path)
+    loaded = VenueDistanceMatrix(locations, cache_dir=str(tmp_path / 'cache'))
+    loaded.write_asset(str(tmp_path / 'copy.bin'))
+
+    assert (tmp_path / 'copy.bin').read_bytes() == (tmp_path / 'venues.bin').read_bytes()
+
+
+def test_locations_without_the_venues_file(tmp_path):
+    locations, built = build(tmp_path)
+    os.remove(locations)
+    loaded = VenueDistanceMatrix(locations, cache_dir=str(tmp_path / 'cache'),
+                                 asset_file=str(tmp_path / 'venues.bin'))
+
+    venue = next(venue for venue, lat in zip(built.venues, built.latitudes) if not np.isnan(lat))
+    i = built.index[venue]
+    assert loaded.locations[venue] == {'location': {'x': built.longitudes[i], 'y': built.latitudes[i]}}
+
+
+def test_edited_venues_file_ignores_a_newer_asset(tmp_path):
+    locations, built = build(tmp_path)
+    with open(locations, 'r') as f:
+        venues = json.load(f)
+    venues.pop(next(iter(venues)))
+    with open(locations, 'w') as f:
+        json.dump(venues, f)
+    # As after a checkout: the stale asset looks newer than the edited venues file
+    asset = str(tmp_path / 'venues.bin')
+    os.utime(asset, (os.path.getmtime(locations) + 60,) * 2)
+
+    loaded = VenueDistanceMatrix(locations, cache_dir=str(tmp_path / 'cache'))
+    assert loaded.version != built.version  # Fell back to the JSON path
+    assert len(loaded.venues) == len(built.venues) - 1
@@ -0,0 +1,55 @@
+"""
+Lessons whose weeks are NUSMods date ranges are placed in teaching weeks even
+though the route sends no semesterStart, so alternate-week labs do not clash.
+"""
+
+import io
+import os
+import subprocess
+import sys
+import time
+
+from framing import decode, read_frame, write_frame
+
+OPTIMIZE_CLI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts', 'optimize_cli.py')
+
+
+def module(code, lecture_day, lab_first_monday):
+    return {"moduleCode": code, "timetable": [
+        {"lessonType": "Lecture", "classNo": "1", "day": lecture_day, "startTime": "1000", "endTime": "1200",
+         "venue": "LT19", "weeks": {"start": "2025-08-11", "end": "2025-11-14"}},
+        # Fortnightly labs in the same slot, one module starting a week after the other
+        {"lessonType": "Laboratory", "classNo": "B01", "day": "Wednesday", "startTime": "1400", "endTime": "1600",
+         "venue": "COM1-0114", "weeks": {"start": lab_first_monday, "end": "2025-11-14", "weekInterval": 2}},
+    ]}
+
+
+def route_payload():
+    """What routes/optimize.js sends: the request body's modules and constraints, plus solver options"""
+    return {
+        "modules": {"CS2100": module("CS2100", "Monday", "2025-08-11"),
+                    "CS2106": module("CS2106", "Tuesday", "2025-08-18")},
+        "constraints": {"preferredTimeSlots": {"Wednesday": {"0800": False}}},
+        "solver": {"deadlineMs": int(time.time() * 1000) + 20000, "numSearchWorkers": 1},
+    }
+
+
+def run_spawned(payload, venues_file):
+    """Run the optimizer as the route's spawn path does: one request frame in, frames out"""
+    request = io.BytesIO()
+    write_frame(request, payload)
+    completed = subprocess.run([sys.executable, OPTIMIZE_CLI, '--framed', '--locations', venues_file],
+                               input=request.getvalue(), capture_output=True, timeout=60, check=True)
+    stdout = io.BytesIO(completed.stdout)
+    while True:
+        message = decode(read_frame(stdout))
+        if message["type"] == "result":
+            return message
+
+
+def test_alternate_week_labs_fit_without_semester_start(venues_file):
+    result = run_spawned(route_payload(), venues_file)
+
+    assert result["status"] == "OPTIMAL"
+    assert result["selection"] == {"CS2100": {"Lecture": "1", "Laboratory": "B01"},
+                                   "CS2106": {"Lecture": "1", "Laboratory": "B01"}}